@@ -9,8 +9,9 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+from importlib.util import find_spec
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,11 +40,18 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     'refbooks',
     'rest_framework',
-    'drf_yasg',
-
 ]
 
+# Документация API (Swagger, ReDoc). Если выключена, drf-yasg не загружается
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=True, cast=bool)
+# Время кэширования схемы OpenAPI и страниц документации (секунды)
+API_DOCS_CACHE_TIMEOUT = config('API_DOCS_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
+    "refbooks.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -85,6 +93,19 @@ DATABASES = {
     }
 }
 
+# Шарды справочников: элементы выбранных справочников хранятся в отдельных файлах SQLite.
+# REFBOOKS_SHARDS - имена шардов через запятую, каждый шард - отдельная БД с тем же алиасом.
+REFBOOKS_SHARDS = config('REFBOOKS_SHARDS', default='', cast=Csv())
+REFBOOKS_SHARD_DIR = Path(config('REFBOOKS_SHARD_DIR', default=str(BASE_DIR / 'shards')))
+
+for shard in REFBOOKS_SHARDS:
+    DATABASES[shard] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": REFBOOKS_SHARD_DIR / f"{shard}.sqlite3",
+    }
+
+DATABASE_ROUTERS = ['refbooks.routers.RefBookShardRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -137,3 +158,29 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
+
+# MessagePack подключается, только если установлен необязательный пакет msgpack
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('refbooks.renderers.MessagePackRenderer')
+
+# Справочники
+# Время жизни закэшированного общего количества справочников в списке (секунды)
+REFBOOKS_COUNT_CACHE_TIMEOUT = config('REFBOOKS_COUNT_CACHE_TIMEOUT', default=60, cast=int)
+
+# Профилирование запросов (cProfile). Профилируются запросы, в заголовке REFBOOKS_PROFILING_HEADER которых
+# передан секрет REFBOOKS_PROFILING_SECRET (без секрета заголовок не учитывается), и случайная доля запросов
+# REFBOOKS_PROFILING_SAMPLE_RATE (от 0 до 1). Хранится не больше REFBOOKS_PROFILING_MAX_PROFILES профилей
+REFBOOKS_PROFILING_ENABLED = config('REFBOOKS_PROFILING_ENABLED', default=False, cast=bool)
+REFBOOKS_PROFILING_HEADER = config('REFBOOKS_PROFILING_HEADER', default='X-Profile')
+REFBOOKS_PROFILING_SECRET = config('REFBOOKS_PROFILING_SECRET', default='')
+REFBOOKS_PROFILING_MAX_PROFILES = config('REFBOOKS_PROFILING_MAX_PROFILES', default=1000, cast=int)
+REFBOOKS_PROFILING_SAMPLE_RATE = config('REFBOOKS_PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+REFBOOKS_PROFILING_DIR = config('REFBOOKS_PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+
+# Фоновые задачи (загрузка версий справочников). REFBOOKS_JOB_WORKERS - количество потоков в процессе приложения,
+# при REFBOOKS_JOBS_EAGER задачи выполняются сразу в потоке запроса
+REFBOOKS_JOB_WORKERS = config('REFBOOKS_JOB_WORKERS', default=2, cast=int)
+REFBOOKS_JOBS_EAGER = config('REFBOOKS_JOBS_EAGER', default=False, cast=bool)
+# Время (секунды), после которого задача без сигнала от выполняющего процесса считается прерванной
+# и ставится в очередь заново. Процесс обновляет сигнал своих задач каждую треть этого времени
+REFBOOKS_JOB_LEASE_TIMEOUT = config('REFBOOKS_JOB_LEASE_TIMEOUT', default=300, cast=int)
@@ -16,31 +16,39 @@ Including another URLconf
 """
 
 # from django.contrib import admin
-from django.urls import path
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Настройка Swagger
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Terminology Service API",
-        default_version='v1',
-        description="API сервиса терминологии",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from django.urls import path, re_path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('refbooks.urls')),
+]
+
+if settings.API_DOCS_ENABLED:
+    from rest_framework import permissions
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    # Настройка Swagger
+    schema_view = get_schema_view(
+        openapi.Info(
+            title="Terminology Service API",
+            default_version='v1',
+            description="API сервиса терминологии",
+            contact=openapi.Contact(email="contact@example.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=[permissions.AllowAny],
+    )
 
-    # Swagger URLs
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-]
\ No newline at end of file
+    # Схема строится один раз и кэшируется на API_DOCS_CACHE_TIMEOUT секунд
+    urlpatterns += [
+        path('swagger/', schema_view.with_ui('swagger', cache_timeout=settings.API_DOCS_CACHE_TIMEOUT),
+             name='schema-swagger-ui'),
+        path('redoc/', schema_view.with_ui('redoc', cache_timeout=settings.API_DOCS_CACHE_TIMEOUT),
+             name='schema-redoc'),
+        re_path(r'^swagger(?P<format>\.json|\.yaml)$',
+                schema_view.without_ui(cache_timeout=settings.API_DOCS_CACHE_TIMEOUT), name='schema-json'),
+    ]
@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import RefBook, RefBookElement, RefBookVersion
+from django.http import QueryDict
+
+from .jobs import submit_job
+from .models import RefBook, RefBookElement, RefBookVersion, RefBookVersionElement, RefBookChange, RefBookJob
+from .sharding import get_db_aliases
 
 
 class RefBookVersionInline(admin.TabularInline):
@@ -12,10 +17,22 @@ class RefBookElementInline(admin.TabularInline):
     fields = ('code', 'value')
 
 
+class RefBookVersionElementInline(admin.TabularInline):
+    model = RefBookVersionElement
+    fields = ('element',)
+    readonly_fields = ('element',)
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(RefBook)
 class RefBookAdmin(admin.ModelAdmin):
     list_display = ('id', 'code', 'name', 'current_version', 'current_version_date')
     search_fields = ('code', 'name')
+    actions = ['rebuild_normalized_values']
 
     def get_inlines(self, request, obj=None):
         if obj is None:
@@ -25,7 +42,7 @@ class RefBookAdmin(admin.ModelAdmin):
     def current_version(self, obj):
         from django.utils import timezone
         current_date = timezone.now().date()
-        current_version = obj.versions.filter(date__lte=current_date).order_by('-date').first()
+        current_version = obj.versions.filter(date__lte=current_date, is_ready=True).order_by('-date').first()
         return current_version.version if current_version else "Нет активной версии"
 
     current_version.short_description = "Текущая версия"
@@ -33,18 +50,36 @@ class RefBookAdmin(admin.ModelAdmin):
     def current_version_date(self, obj):
         from django.utils import timezone
         current_date = timezone.now().date()
-        current_version = obj.versions.filter(date__lte=current_date).order_by('-date').first()
+        current_version = obj.versions.filter(date__lte=current_date, is_ready=True).order_by('-date').first()
         return current_version.date if current_version else None
 
     current_version_date.short_description = "Дата начала действия версии"
 
+    @admin.action(description="Перестроить нормализованные значения элементов")
+    def rebuild_normalized_values(self, request, queryset):
+        for refbook in queryset:
+            submit_job(RefBookJob.KIND_REBUILD_NORMALIZED, {'refbook_id': refbook.pk}, refbook=refbook)
+        self.message_user(request, f"Поставлено задач в очередь: {len(queryset)}")
+
 
 @admin.register(RefBookVersion)
 class RefBookVersionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'refbook_code', 'refbook_name', 'version', 'date')
+    list_display = ('id', 'refbook_code', 'refbook_name', 'version', 'date', 'shared_storage')
     search_fields = ('refbook__code', 'refbook__name', 'version')
-    list_filter = ('refbook', 'date')
-    inlines = [RefBookElementInline]
+    list_filter = ('refbook', 'date', 'shared_storage')
+    readonly_fields = ('shared_storage',)
+
+    def get_inlines(self, request, obj=None):
+        if obj is not None and obj.shared_storage:
+            return [RefBookVersionElementInline]
+        return [RefBookElementInline]
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        # Элементы справочника из шарда читаются из БД шарда
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        if obj.pk is not None:
+            kwargs['queryset'] = kwargs['queryset'].using(obj.elements_db)
+        return kwargs
 
     def refbook_code(self, obj):
         return obj.refbook.code
@@ -57,8 +92,80 @@ class RefBookVersionAdmin(admin.ModelAdmin):
     refbook_name.short_description = "Наименование справочника"
 
 
+class ElementDatabaseFilter(admin.SimpleListFilter):
+    """
+    Выбор БД (основной или шарда), элементы которой показываются в списке.
+    Сам выбор применяется в RefBookElementAdmin.get_queryset.
+    """
+    title = "База данных"
+    parameter_name = 'db'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in get_db_aliases()]
+
+    def value(self):
+        return super().value() or 'default'
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset
+
+
 @admin.register(RefBookElement)
 class RefBookElementAdmin(admin.ModelAdmin):
     list_display = ('id', 'version', 'code', 'value')
     search_fields = ('code', 'value')
     list_filter = ('version__refbook', 'version')
+
+    def get_list_filter(self, request):
+        if settings.REFBOOKS_SHARDS:
+            return (ElementDatabaseFilter, *self.list_filter)
+        return self.list_filter
+
+    def get_queryset(self, request):
+        # Элементы справочников из шардов читаются из БД, выбранной в фильтре списка
+        return super().get_queryset(request).using(self.get_db_alias(request))
+
+    @staticmethod
+    def get_db_alias(request):
+        alias = request.GET.get(ElementDatabaseFilter.parameter_name)
+        if alias is None:
+            # Страница элемента открывается из списка с сохраненными фильтрами
+            filters = QueryDict(request.GET.get('_changelist_filters', ''))
+            alias = filters.get(ElementDatabaseFilter.parameter_name)
+        return alias if alias in get_db_aliases() else 'default'
+
+
+@admin.register(RefBookChange)
+class RefBookChangeAdmin(admin.ModelAdmin):
+    list_display = ('seq', 'object_type', 'action', 'object_id', 'refbook_id', 'version_id', 'created_at')
+    list_filter = ('object_type', 'action')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RefBookJob)
+class RefBookJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'refbook', 'processed', 'total', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    exclude = ('payload',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
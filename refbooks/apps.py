@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RefbooksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "refbooks"
+
+    def ready(self):
+        from refbooks import signals  # noqa: F401
@@ -0,0 +1,173 @@
+"""
+Журнал изменений справочников для инкрементальной синхронизации реплик.
+
+Одиночные save() и удаление справочников и версий попадают в журнал через сигналы (refbooks.signals).
+Массовые операции (bulk_create) сигналов не вызывают, поэтому код, который ими пользуется,
+должен сам вызвать record_changes.
+
+Удаление элементов записывается пакетно в ChangeLoggedQuerySet.delete (refbooks.models).
+Обработчиков post_delete у элементов нет, чтобы Django удалял их одним запросом, поэтому
+удаление версии или справочника не записывает удаление каждого их элемента:
+реплика удаляет элементы вместе с версией.
+
+Изменения элементов записываются в журнал той БД, где хранятся элементы (основной или шарда),
+в одной транзакции с самим изменением, поэтому запись в шард не блокирует основную БД.
+При чтении журнала (collect_shard_changes) новые записи шардов переносятся в журнал основной БД
+и получают в нем порядковые номера. Идентификаторы элементов уникальны только в пределах БД,
+поэтому элемент в журнале определяется парой (version_id, code).
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from refbooks.models import (
+    RefBook, RefBookVersion, RefBookElement, RefBookVersionElement, RefBookChange, SharedRefBookElement
+)
+
+BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=4096)
+def get_version_refbook_id(version_id):
+    """
+    Идентификатор справочника по идентификатору версии.
+    Кэшируется, чтобы каскадное удаление элементов версии не делало запрос на каждый элемент.
+    """
+    return RefBookVersion.objects.filter(pk=version_id).values_list('refbook_id', flat=True).first()
+
+
+def _build_change(instance, action):
+    if isinstance(instance, RefBook):
+        return RefBookChange(
+            object_type=RefBookChange.OBJECT_REFBOOK,
+            refbook_id=instance.pk,
+            data={
+                'code': instance.code,
+                'name': instance.name,
+                'description': instance.description,
+            },
+        )
+    if isinstance(instance, RefBookVersion):
+        return RefBookChange(
+            object_type=RefBookChange.OBJECT_VERSION,
+            refbook_id=instance.refbook_id,
+            version_id=instance.pk,
+            data={
+                'refbook_id': instance.refbook_id,
+                'version': instance.version,
+                'date': instance.date.isoformat(),
+                'shared_storage': instance.shared_storage,
+                'is_ready': instance.is_ready,
+            },
+        )
+    if isinstance(instance, RefBookElement):
+        return RefBookChange(
+            object_type=RefBookChange.OBJECT_ELEMENT,
+            refbook_id=get_version_refbook_id(instance.version_id),
+            version_id=instance.version_id,
+            data={
+                'version_id': instance.version_id,
+                'code': instance.code,
+                'value': instance.value,
+            },
+        )
+    if isinstance(instance, RefBookVersionElement):
+        data = {'version_id': instance.version_id, 'code': instance.element.code}
+        if action != RefBookChange.ACTION_DELETE:
+            data['value'] = instance.element.value
+        return RefBookChange(
+            object_type=RefBookChange.OBJECT_VERSION_ELEMENT,
+            refbook_id=get_version_refbook_id(instance.version_id),
+            version_id=instance.version_id,
+            data=data,
+        )
+    raise TypeError(f"Изменения {type(instance).__name__} не записываются в журнал")
+
+
+def record_changes(instances, action, using='default'):
+    """
+    Записывает в журнал БД using изменения нескольких объектов одним запросом.
+    Изменения элементов записываются в журнал БД, в которой хранятся элементы.
+    """
+    changes = []
+    for instance in instances:
+        change = _build_change(instance, action)
+        change.action = action
+        change.object_id = instance.pk
+        if action == RefBookChange.ACTION_DELETE:
+            change.data = {
+                key: change.data[key] for key in ('refbook_id', 'version_id', 'code') if key in change.data
+            }
+        changes.append(change)
+
+    RefBookChange.objects.using(using).bulk_create(changes, batch_size=BATCH_SIZE)
+    return changes
+
+
+def record_deletes(queryset):
+    """
+    Записывает в журнал удаление элементов queryset. Элементы не загружаются целиком:
+    читаются только идентификаторы элемента и версии и код.
+    """
+    if queryset.model is RefBookVersionElement:
+        instances = [
+            RefBookVersionElement(pk=pk, version_id=version_id, element=SharedRefBookElement(code=code))
+            for pk, version_id, code in queryset.values_list('pk', 'version_id', 'element__code')
+        ]
+    else:
+        instances = [
+            RefBookElement(pk=pk, version_id=version_id, code=code)
+            for pk, version_id, code in queryset.values_list('pk', 'version_id', 'code')
+        ]
+    return record_changes(instances, RefBookChange.ACTION_DELETE, using=queryset.db)
+
+
+def record_change(instance, action, using='default'):
+    return record_changes([instance], action, using=using)[0]
+
+
+def collect_changes(shard):
+    """
+    Переносит в журнал основной БД записи журнала шарда, которые еще не были перенесены.
+    Порядок изменений шарда сохраняется. Повторный перенос тех же записей
+    (например, при одновременных запросах) пропускается по ограничению уникальности (source_db, source_seq).
+    """
+    last_seq = RefBookChange.objects.filter(source_db=shard).aggregate(
+        last_seq=Max('source_seq')
+    )['last_seq'] or 0
+
+    while True:
+        rows = list(RefBookChange.objects.using(shard).filter(seq__gt=last_seq).order_by('seq')[:BATCH_SIZE])
+        if not rows:
+            return
+        with transaction.atomic():
+            RefBookChange.objects.bulk_create(
+                [
+                    RefBookChange(
+                        object_type=row.object_type,
+                        action=row.action,
+                        object_id=row.object_id,
+                        refbook_id=row.refbook_id,
+                        version_id=row.version_id,
+                        data=row.data,
+                        created_at=row.created_at,
+                        source_db=shard,
+                        source_seq=row.seq,
+                    )
+                    for row in rows
+                ],
+                ignore_conflicts=True,
+            )
+        last_seq = rows[-1].seq
+
+
+def collect_shard_changes():
+    """
+    Переносит в журнал основной БД новые записи журналов шардов, в которых хранятся справочники.
+    """
+    shards = RefBook.objects.exclude(shard='').values_list('shard', flat=True).distinct()
+    for shard in shards:
+        if shard in settings.REFBOOKS_SHARDS:
+            collect_changes(shard)
@@ -0,0 +1,305 @@
+"""
+Клиент API сервиса терминологии.
+
+Клиент не зависит от Django и может использоваться в любом Python-сервисе:
+
+    client = RefBookClient('http://terminology.local/api/', ttl=300, cache_dir='/var/cache/refbooks')
+    client.check_element(1, code='J00', value='Острый насморк')
+
+- HTTP-соединения переиспользуются (keep-alive) из пула.
+- Загруженные версии справочников кэшируются в памяти и, если указан cache_dir, на диске.
+- Пока запись кэша свежа (моложе ttl секунд), check_element и get_value отвечают без обращения к сети.
+  Устаревшая запись перепроверяется запросом с If-None-Match: если версия не изменилась,
+  сервер отвечает 304 без тела.
+- Если сервис недоступен, используется устаревшая запись кэша (офлайн-валидация).
+"""
+import hashlib
+import http.client
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from refbooks.normalization import normalize_value
+
+
+class RefBookClientError(Exception):
+    """
+    Ошибка обращения к сервису терминологии.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """
+    Пул keep-alive соединений к одному хосту.
+    """
+
+    def __init__(self, base_url, size=4, timeout=10):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Неподдерживаемая схема URL: {base_url}")
+
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.connections = queue.LifoQueue(maxsize=size)
+
+    def _new_connection(self):
+        return self.connection_class(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, headers=None):
+        """
+        Выполняет запрос и возвращает (status, headers, body).
+        Если переиспользованное соединение оказалось закрыто сервером, запрос повторяется на новом.
+        """
+        try:
+            connection, reused = self.connections.get_nowait(), True
+        except queue.Empty:
+            connection, reused = self._new_connection(), False
+
+        while True:
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                if not reused:
+                    raise
+                connection, reused = self._new_connection(), False
+                continue
+            except OSError:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, response.headers, body
+
+    def _release(self, connection):
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class CachedVersion:
+    """
+    Закэшированные элементы версии справочника.
+    """
+
+    def __init__(self, elements, etag, fetched_at):
+        self.elements = elements
+        self.etag = etag
+        self.fetched_at = fetched_at
+        self._normalized = None
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    @property
+    def normalized(self):
+        if self._normalized is None:
+            self._normalized = {code: normalize_value(value) for code, value in self.elements.items()}
+        return self._normalized
+
+    def to_dict(self):
+        return {'elements': self.elements, 'etag': self.etag, 'fetched_at': self.fetched_at}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['elements'], data['etag'], data['fetched_at'])
+
+
+class RefBookClient:
+    """
+    Клиент API сервиса терминологии с локальным кэшем версий справочников.
+
+    Параметры:
+      - base_url: адрес API, например http://127.0.0.1:8000/api/
+      - ttl: время в секундах, в течение которого закэшированная версия считается свежей
+      - cache_dir: каталог для хранения кэша на диске (по умолчанию только память)
+      - pool_size: максимальное количество keep-alive соединений
+      - timeout: таймаут сетевых операций в секундах
+    """
+
+    def __init__(self, base_url, ttl=300, cache_dir=None, pool_size=4, timeout=10):
+        self.base_url = base_url
+        self.base_path = urlsplit(base_url).path.rstrip('/') + '/'
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.pool = ConnectionPool(base_url, size=pool_size, timeout=timeout)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, path, params=None, headers=None):
+        url = self.base_path + path
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        if params:
+            url += '?' + urlencode(params)
+
+        status, response_headers, body = self.pool.request(
+            'GET', url, headers={'Accept': 'application/json', **(headers or {})}
+        )
+        if status == 304:
+            return status, response_headers, None
+        if status >= 400:
+            try:
+                message = json.loads(body).get('error') or body.decode()
+            except ValueError:
+                message = body.decode(errors='replace')
+            raise RefBookClientError(message, status=status)
+        return status, response_headers, json.loads(body)
+
+    def get_refbooks(self, date=None):
+        """
+        Список справочников. Опционально - только имеющих версию на дату (ГГГГ-ММ-ДД).
+        """
+        _, _, data = self._get('refbooks/', {'date': date})
+        return data['refbooks']
+
+    def get_elements(self, refbook_id, version=None):
+        """
+        Элементы версии справочника в виде словаря {код: значение}.
+        Если версия не указана, используется текущая версия справочника.
+        """
+        return self._get_version(refbook_id, version).elements
+
+    def get_value(self, refbook_id, code, version=None):
+        """
+        Значение элемента по коду или None, если элемента нет.
+        """
+        return self._get_version(refbook_id, version).elements.get(code)
+
+    def check_element(self, refbook_id, code, value, version=None, normalized=False):
+        """
+        Проверяет наличие элемента в версии справочника по локальной копии версии.
+        При normalized=True значение сравнивается без учета регистра, ё/е и лишних пробелов.
+        """
+        cached = self._get_version(refbook_id, version)
+        if normalized:
+            return cached.normalized.get(code) == normalize_value(value)
+        return cached.elements.get(code) == value
+
+    def invalidate(self, refbook_id=None):
+        """
+        Сбрасывает кэш всех справочников или одного справочника в памяти и на диске,
+        включая записи, которые есть только на диске (например, после перезапуска).
+        """
+        with self._lock:
+            for key in list(self._cache):
+                if refbook_id is None or key[0] == refbook_id:
+                    del self._cache[key]
+            if self.cache_dir:
+                self._remove_from_disk(refbook_id)
+
+    def _get_version(self, refbook_id, version):
+        key = (refbook_id, version)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is None:
+            cached = self._load_from_disk(key)
+
+        if cached is not None and cached.is_fresh(self.ttl):
+            return cached
+
+        headers = {'If-None-Match': cached.etag} if cached is not None and cached.etag else {}
+        try:
+            status, response_headers, data = self._get(
+                f'refbooks/{refbook_id}/elements', {'version': version}, headers
+            )
+        except (OSError, http.client.HTTPException):
+            if cached is not None:
+                # Сервис недоступен: отвечаем по устаревшей копии
+                return cached
+            raise
+
+        if status == 304:
+            cached.fetched_at = time.time()
+        else:
+            cached = CachedVersion(
+                {element['code']: element['value'] for element in data['elements']},
+                response_headers.get('ETag'),
+                time.time(),
+            )
+
+        with self._lock:
+            self._cache[key] = cached
+        self._save_to_disk(key, cached)
+        return cached
+
+    def _cache_path(self, key):
+        name = hashlib.sha1(f"{self.base_url}|{key[0]}|{key[1]}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), encoding='utf-8') as file:
+                return CachedVersion.from_dict(json.load(file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_to_disk(self, key, cached):
+        if not self.cache_dir:
+            return
+        # Ключ сохраняется в файле, чтобы invalidate находил записи по справочнику (имя файла - хэш ключа)
+        data = {**cached.to_dict(), 'key': [self.base_url, key[0], key[1]]}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, self._cache_path(key))
+
+    def _remove_from_disk(self, refbook_id):
+        """
+        Удаляет файлы кэша этого клиента для справочника (или всех справочников).
+        Файлы, ключ которых прочитать не удалось, тоже удаляются: их справочник неизвестен.
+        """
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                with open(path, encoding='utf-8') as file:
+                    base_url, cached_refbook_id, _ = json.load(file)['key']
+            except (OSError, ValueError, KeyError, TypeError):
+                base_url, cached_refbook_id = self.base_url, None
+            if base_url != self.base_url:
+                continue
+            if refbook_id is None or cached_refbook_id is None or cached_refbook_id == refbook_id:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
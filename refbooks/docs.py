@@ -0,0 +1,26 @@
+"""
+Описание API для drf-yasg.
+
+Если документация отключена (API_DOCS_ENABLED = False), drf-yasg не импортируется:
+swagger_auto_schema ничего не делает, а openapi принимает любые обращения и вызовы,
+поэтому описания схем в refbooks.views не требуют изменений.
+"""
+from django.conf import settings
+
+
+class _OpenAPIStub:
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+if settings.API_DOCS_ENABLED:
+    from drf_yasg import openapi
+    from drf_yasg.utils import swagger_auto_schema
+else:
+    openapi = _OpenAPIStub()
+
+    def swagger_auto_schema(**kwargs):
+        return lambda view_method: view_method
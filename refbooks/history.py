@@ -0,0 +1,63 @@
+"""
+История кода элемента: в каких версиях справочника и в какие периоды действовал код и с каким значением.
+"""
+from datetime import timedelta
+
+from django.db.models import F, OuterRef, Subquery
+
+from refbooks.models import RefBookVersion, RefBookElement, RefBookVersionElement
+
+
+def _next_version_date():
+    """
+    Дата начала следующей версии того же справочника - конец периода действия версии элемента.
+    """
+    return Subquery(
+        RefBookVersion.objects.filter(
+            refbook_id=OuterRef('version__refbook_id'),
+            date__gt=OuterRef('version__date'),
+            is_ready=True
+        ).order_by('date').values('date')[:1]
+    )
+
+
+def get_code_history(refbook, code):
+    """
+    Версии справочника, содержащие код, в порядке дат начала действия.
+
+    Элементы обычного и общего хранилища выбираются одним запросом (UNION) по индексу (code, version)
+    с присоединением версий, поэтому стоимость не зависит от количества версий справочника.
+    """
+    using = refbook.db_alias
+
+    inline = RefBookElement.objects.using(using).filter(
+        version__refbook_id=refbook.pk,
+        version__is_ready=True,
+        code=code
+    ).annotate(
+        version_number=F('version__version'),
+        date_from=F('version__date'),
+        next_date=_next_version_date(),
+        element_value=F('value'),
+    ).values('version_number', 'date_from', 'next_date', 'element_value')
+
+    shared = RefBookVersionElement.objects.using(using).filter(
+        version__refbook_id=refbook.pk,
+        version__is_ready=True,
+        element__code=code
+    ).annotate(
+        version_number=F('version__version'),
+        date_from=F('version__date'),
+        next_date=_next_version_date(),
+        element_value=F('element__value'),
+    ).values('version_number', 'date_from', 'next_date', 'element_value')
+
+    return [
+        {
+            'version': row['version_number'],
+            'date_from': row['date_from'],
+            'date_to': row['next_date'] - timedelta(days=1) if row['next_date'] else None,
+            'value': row['element_value'],
+        }
+        for row in inline.union(shared, all=True).order_by('date_from')
+    ]
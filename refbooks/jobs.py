@@ -0,0 +1,302 @@
+"""
+Фоновые задачи: загрузка версий справочников и перестроение производных данных.
+
+Задачи выполняются пулом потоков внутри процесса приложения (без внешнего брокера), их состояние
+и прогресс хранятся в таблице RefBookJob, поэтому запрос на загрузку возвращается сразу,
+а статус задачи можно получить из любого процесса через /jobs/<id>.
+Количество потоков задается настройкой REFBOOKS_JOB_WORKERS. При REFBOOKS_JOBS_EAGER
+задачи выполняются сразу в вызывающем потоке (используется в тестах).
+
+Очередь хранится только в памяти процесса. Процесс захватывает задачу сменой статуса pending -> running,
+записывая свой идентификатор (worker), и периодически обновляет heartbeat_at своих задач.
+Задачи в статусе running без сигнала дольше REFBOOKS_JOB_LEASE_TIMEOUT считаются прерванными
+(процесс остановился) и вместе с ожидающими задачами ставятся в очередь заново (recover_jobs):
+при запуске пула, периодически в процессах с запущенным пулом и командой recover_refbook_jobs.
+Результат задачи сохраняется, только пока она принадлежит процессу, поэтому задачу,
+переданную другому процессу, прежний исполнитель не завершает.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from refbooks.changes import record_changes
+from refbooks.models import (
+    RefBook, RefBookVersion, RefBookElement, RefBookChange, RefBookJob, SharedRefBookElement
+)
+from refbooks.normalization import normalize_value
+from refbooks.sharding import get_db_aliases
+from refbooks.storage import BATCH_SIZE, share_version_elements
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+class JobLost(Exception):
+    """
+    Задача передана другому процессу (сигнал исполнителя не обновлялся дольше REFBOOKS_JOB_LEASE_TIMEOUT).
+    """
+
+
+def get_worker_id():
+    """
+    Идентификатор текущего процесса. Вычисляется при каждом вызове, так как процессы
+    сервера приложения могут создаваться fork после импорта модуля.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_executor():
+    global _executor, _heartbeat_thread
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REFBOOKS_JOB_WORKERS,
+                thread_name_prefix='refbooks-job'
+            )
+            recover_jobs(_executor)
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name='refbooks-job-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+        return _executor
+
+
+def _heartbeat_loop():
+    interval = settings.REFBOOKS_JOB_LEASE_TIMEOUT / 3
+    while True:
+        time.sleep(interval)
+        try:
+            RefBookJob.objects.filter(status=RefBookJob.STATUS_RUNNING, worker=get_worker_id()).update(
+                heartbeat_at=timezone.now()
+            )
+            if _executor is not None:
+                recover_jobs(_executor)
+        except Exception:
+            logger.exception("Не удалось обновить сигнал фоновых задач")
+        finally:
+            connections.close_all()
+
+
+def recover_jobs(executor=None):
+    """
+    Ставит в очередь ожидающие задачи и задачи, процесс которых остановился (в статусе running
+    без сигнала дольше REFBOOKS_JOB_LEASE_TIMEOUT). Без executor задачи выполняются в текущем потоке.
+    Возвращает идентификаторы поставленных в очередь задач.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.REFBOOKS_JOB_LEASE_TIMEOUT)
+    interrupted = RefBookJob.objects.filter(
+        Q(heartbeat_at__lt=expired) | Q(heartbeat_at__isnull=True),
+        status=RefBookJob.STATUS_RUNNING
+    ).update(status=RefBookJob.STATUS_PENDING, worker='', heartbeat_at=None)
+    job_ids = list(
+        RefBookJob.objects.filter(status=RefBookJob.STATUS_PENDING).order_by('pk').values_list('pk', flat=True)
+    )
+    if interrupted:
+        logger.warning("Прервано задач: %s, они будут выполнены заново", interrupted)
+    for job_id in job_ids:
+        if executor is None:
+            run_job(job_id)
+        else:
+            executor.submit(_run_in_thread, job_id)
+    return job_ids
+
+
+def submit_job(kind, payload, refbook=None):
+    """
+    Создает задачу и ставит ее в очередь после фиксации текущей транзакции.
+    """
+    job = RefBookJob.objects.create(kind=kind, payload=payload, refbook=refbook)
+    if settings.REFBOOKS_JOBS_EAGER:
+        run_job(job.pk)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_thread, job.pk))
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # У каждого потока свои соединения с БД, закрываем их после задачи
+        connections.close_all()
+
+
+def _owned(job):
+    return RefBookJob.objects.filter(pk=job.pk, status=RefBookJob.STATUS_RUNNING, worker=job.worker)
+
+
+def _set_progress(job, processed, total=None):
+    job.processed = processed
+    fields = {'processed': processed, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        job.total = total
+        fields['total'] = total
+    if not _owned(job).update(**fields):
+        raise JobLost(job.pk)
+
+
+def finish_job(job, status, result=None, error=''):
+    """
+    Сохраняет результат задачи, если она по-прежнему принадлежит текущему процессу, иначе JobLost.
+    Обработчик может вызвать ее сам в транзакции с последним изменением данных,
+    чтобы повторный запуск задачи не повторил уже зафиксированную работу.
+    """
+    job.status = status
+    job.result = result or {}
+    job.error = error
+    if status == RefBookJob.STATUS_DONE:
+        job.processed = job.total
+    # Загруженные элементы больше не нужны, не храним их в таблице задач
+    job.payload = {key: value for key, value in job.payload.items() if key != 'elements'}
+    job.finished_at = timezone.now()
+    updated = _owned(job).update(
+        status=job.status, processed=job.processed, result=job.result, error=job.error,
+        payload=job.payload, finished_at=job.finished_at
+    )
+    if not updated:
+        raise JobLost(job.pk)
+
+
+def run_job(job_id):
+    """
+    Выполняет задачу и сохраняет ее результат или краткое описание ошибки
+    (подробности ошибки записываются в журнал приложения).
+    """
+    worker = get_worker_id()
+    now = timezone.now()
+    claimed = RefBookJob.objects.filter(pk=job_id, status=RefBookJob.STATUS_PENDING).update(
+        status=RefBookJob.STATUS_RUNNING, worker=worker, started_at=now, heartbeat_at=now
+    )
+    if not claimed:
+        # Задача уже выполняется или завершена
+        return
+    job = RefBookJob.objects.get(pk=job_id)
+
+    try:
+        try:
+            result = JOB_HANDLERS[job.kind](job)
+        except JobLost:
+            raise
+        except Exception as exc:
+            logger.exception("Задача %s (%s) завершилась с ошибкой", job.pk, job.kind)
+            finish_job(job, RefBookJob.STATUS_FAILED, error=f"Ошибка выполнения задачи ({type(exc).__name__})")
+        else:
+            if job.status != RefBookJob.STATUS_DONE:
+                finish_job(job, RefBookJob.STATUS_DONE, result)
+    except JobLost:
+        logger.warning("Задача %s передана другому процессу, результат не сохранен", job.pk)
+
+
+def import_version(job):
+    """
+    Создает версию справочника и загружает ее элементы пакетами.
+
+    Пакеты фиксируются по отдельности, чтобы прогресс был виден и не блокировать БД на время
+    всей загрузки. До окончания загрузки версия не готова (is_ready=False) и не выбирается
+    как текущая. Версия становится готовой в одной транзакции с завершением задачи.
+    При ошибке созданная версия удаляется вместе с загруженными элементами, а версия,
+    оставшаяся от прерванного выполнения задачи, загружается заново.
+    """
+    payload = job.payload
+    elements = payload['elements']
+    _set_progress(job, 0, total=len(elements))
+
+    # Задача принадлежит текущему процессу (см. _set_progress), прежний исполнитель остановлен
+    RefBookVersion.objects.filter(
+        refbook_id=payload['refbook_id'], version=payload['version'], is_ready=False
+    ).delete()
+
+    version = RefBookVersion.objects.create(
+        refbook_id=payload['refbook_id'],
+        version=payload['version'],
+        date=date.fromisoformat(payload['date']),
+        is_ready=False,
+    )
+    try:
+        manager = RefBookElement.objects.using(version.elements_db)
+        for start in range(0, len(elements), BATCH_SIZE):
+            batch = elements[start:start + BATCH_SIZE]
+            with transaction.atomic(using=version.elements_db):
+                created = manager.bulk_create(
+                    [RefBookElement(version_id=version.pk, code=item['code'], value=item['value']) for item in batch]
+                )
+                record_changes(created, RefBookChange.ACTION_CREATE, using=version.elements_db)
+            _set_progress(job, start + len(batch))
+
+        with transaction.atomic():
+            if payload.get('shared_storage'):
+                share_version_elements(version)
+            version.is_ready = True
+            version.save(update_fields=['is_ready'])
+            finish_job(job, RefBookJob.STATUS_DONE, {'version_id': version.pk, 'elements': len(elements)})
+    except Exception:
+        version.delete()
+        raise
+
+    return job.result
+
+
+def _rebuild_normalized(queryset, job, processed):
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').only('pk', 'value', 'normalized_value')[:BATCH_SIZE]
+        )
+        if not batch:
+            return processed
+        changed = []
+        for obj in batch:
+            normalized_value = normalize_value(obj.value)
+            if obj.normalized_value != normalized_value:
+                obj.normalized_value = normalized_value
+                changed.append(obj)
+        queryset.model.objects.using(queryset.db).bulk_update(changed, ['normalized_value'])
+        last_pk = batch[-1].pk
+        processed += len(batch)
+        _set_progress(job, processed)
+
+
+def rebuild_normalized(job):
+    """
+    Пересчитывает нормализованные значения элементов справочника (или всех справочников),
+    например после изменения правил нормализации.
+    """
+    refbook_id = job.payload.get('refbook_id')
+    if refbook_id is not None:
+        aliases = [RefBook.objects.get(pk=refbook_id).db_alias]
+    else:
+        aliases = get_db_aliases()
+
+    querysets = []
+    for using in aliases:
+        elements = RefBookElement.objects.using(using)
+        shared = SharedRefBookElement.objects.using(using)
+        if refbook_id is not None:
+            elements = elements.filter(version__refbook_id=refbook_id)
+            shared = shared.filter(memberships__version__refbook_id=refbook_id).distinct()
+        querysets.extend([elements, shared])
+
+    _set_progress(job, 0, total=sum(queryset.count() for queryset in querysets))
+    processed = 0
+    for queryset in querysets:
+        processed = _rebuild_normalized(queryset, job, processed)
+
+    return {'elements': processed}
+
+
+JOB_HANDLERS = {
+    RefBookJob.KIND_IMPORT_VERSION: import_version,
+    RefBookJob.KIND_REBUILD_NORMALIZED: rebuild_normalized,
+}
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from refbooks.models import RefBook
+from refbooks.sharding import get_db_aliases, move_refbook
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит элементы всех версий справочника в отдельный файл SQLite (шард) "
+        "или обратно в основную БД. Шарды перечисляются в настройке REFBOOKS_SHARDS. "
+        "Во время переноса запись в исходную БД ожидает его завершения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('code', help="Код справочника.")
+        parser.add_argument(
+            'shard',
+            help="Имя шарда из REFBOOKS_SHARDS или default для переноса в основную БД."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            refbook = RefBook.objects.get(code=options['code'])
+        except RefBook.DoesNotExist:
+            raise CommandError(f"Справочник не найден: {options['code']}")
+
+        if options['shard'] not in get_db_aliases():
+            raise CommandError(
+                f"Неизвестный шард: {options['shard']}. Доступны: {', '.join(get_db_aliases())}"
+            )
+
+        source = refbook.db_alias
+        move_refbook(refbook, options['shard'])
+        self.stdout.write(f"{refbook.code}: {source} -> {refbook.db_alias}")
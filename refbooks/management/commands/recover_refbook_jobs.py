@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from refbooks.jobs import recover_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет ожидающие фоновые задачи и задачи, прерванные остановкой процесса приложения "
+        "(без сигнала исполнителя дольше REFBOOKS_JOB_LEASE_TIMEOUT). Задачи выполняются в процессе команды."
+    )
+
+    def handle(self, *args, **options):
+        job_ids = recover_jobs()
+        self.stdout.write(f"Запущено задач: {len(job_ids)}")
@@ -0,0 +1,80 @@
+import io
+import pstats
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from refbooks.profiling import get_profile_dir, parse_profile_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает самые медленные запросы из сохраненных профилей "
+        "и сводку по функциям, в которых они провели больше всего времени."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help="Количество самых медленных запросов (по умолчанию 10)."
+        )
+        parser.add_argument(
+            '--functions',
+            type=int,
+            default=20,
+            help="Количество функций в сводке (по умолчанию 20)."
+        )
+        parser.add_argument(
+            '--path',
+            default='',
+            help="Учитывать только запросы, путь которых содержит указанную строку."
+        )
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            choices=['cumulative', 'tottime', 'calls'],
+            help="Сортировка сводки по функциям (по умолчанию cumulative)."
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Удалить все сохраненные профили."
+        )
+
+    def handle(self, *args, **options):
+        profile_dir = get_profile_dir()
+        profiles = []
+        if profile_dir.is_dir():
+            for file in profile_dir.iterdir():
+                info = parse_profile_name(file.name)
+                if info is not None and options['path'] in info['path']:
+                    profiles.append((file, info))
+
+        if options['clear']:
+            for file, _ in profiles:
+                file.unlink()
+            self.stdout.write(f"Удалено профилей: {len(profiles)}")
+            return
+
+        if not profiles:
+            self.stdout.write(f"Профили не найдены в {profile_dir}")
+            return
+
+        profiles.sort(key=lambda item: item[1]['duration_ms'], reverse=True)
+        slowest = profiles[:options['limit']]
+
+        self.stdout.write(f"Самые медленные запросы (всего профилей: {len(profiles)}):")
+        for file, info in slowest:
+            captured = datetime.fromtimestamp(info['timestamp']).isoformat(sep=' ', timespec='seconds')
+            self.stdout.write(
+                f"{info['duration_ms']:>8} мс  {info['method']:<6} {info['path']:<40} {captured}  {file.name}"
+            )
+
+        self.stdout.write("")
+        self.stdout.write("Сводка по функциям для этих запросов:")
+        output = io.StringIO()
+        stats = pstats.Stats(*(str(file) for file, _ in slowest), stream=output)
+        stats.sort_stats(options['sort']).print_stats(options['functions'])
+        self.stdout.write(output.getvalue())
@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from refbooks.models import (
+    RefBook, RefBookVersion, RefBookElement, RefBookVersionElement, SharedRefBookElement
+)
+from refbooks.sharding import get_db_aliases
+from refbooks.storage import (
+    share_version_elements, unshare_version_elements, delete_orphan_shared_elements
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переводит элементы версий справочников в общее хранилище, где одинаковые пары "
+        "(код, значение) хранятся один раз. С флагом --revert возвращает элементы в версии."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refbook',
+            action='append',
+            dest='refbooks',
+            default=[],
+            help="Код справочника (можно указать несколько раз). По умолчанию - все справочники."
+        )
+        parser.add_argument(
+            '--revert',
+            action='store_true',
+            help="Вернуть элементы из общего хранилища в собственные таблицы версий."
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help="Выполнить VACUUM после переноса, чтобы уменьшить файл SQLite."
+        )
+
+    def handle(self, *args, **options):
+        # Версии, которые еще загружаются, переводит сама задача загрузки
+        versions = RefBookVersion.objects.filter(is_ready=True).select_related('refbook').order_by(
+            'refbook_id', 'date'
+        )
+
+        if options['refbooks']:
+            found = set(RefBook.objects.filter(
+                code__in=options['refbooks']
+            ).values_list('code', flat=True))
+            missing = set(options['refbooks']) - found
+            if missing:
+                raise CommandError(f"Справочники не найдены: {', '.join(sorted(missing))}")
+            versions = versions.filter(refbook__code__in=options['refbooks'])
+
+        before = self._stats()
+
+        for version in versions:
+            if options['revert']:
+                unshare_version_elements(version)
+            else:
+                share_version_elements(version)
+            self.stdout.write(f"{version.refbook.code} {version.version}: готово")
+
+        orphans = sum(delete_orphan_shared_elements(using) for using in get_db_aliases())
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+        after = self._stats()
+
+        self.stdout.write(f"Удалено неиспользуемых элементов общего хранилища: {orphans}")
+        for label, key in (
+            ("Элементы версий", 'elements'),
+            ("Элементы общего хранилища", 'shared'),
+            ("Ссылки версий на общее хранилище", 'memberships'),
+            ("Размер основной БД, байт", 'db_size'),
+        ):
+            self.stdout.write(f"{label}: {before[key]} -> {after[key]}")
+
+    def _stats(self):
+        aliases = get_db_aliases()
+        stats = {
+            'elements': sum(RefBookElement.objects.using(using).count() for using in aliases),
+            'shared': sum(SharedRefBookElement.objects.using(using).count() for using in aliases),
+            'memberships': sum(RefBookVersionElement.objects.using(using).count() for using in aliases),
+            'db_size': '-',
+        }
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA page_count")
+                page_count = cursor.fetchone()[0]
+                cursor.execute("PRAGMA page_size")
+                page_size = cursor.fetchone()[0]
+            stats['db_size'] = page_count * page_size
+        return stats
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0002_alter_refbookversion_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbookversion",
+            name="shared_storage",
+            field=models.BooleanField(
+                default=False, verbose_name="Элементы в общем хранилище"
+            ),
+        ),
+        migrations.CreateModel(
+            name="SharedRefBookElement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.CharField(max_length=100, verbose_name="Код элемента")),
+                (
+                    "value",
+                    models.CharField(max_length=300, verbose_name="Значение элемента"),
+                ),
+            ],
+            options={
+                "verbose_name": "Элемент общего хранилища",
+                "verbose_name_plural": "Элементы общего хранилища",
+                "unique_together": {("code", "value")},
+            },
+        ),
+        migrations.CreateModel(
+            name="RefBookVersionElement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "version",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shared_memberships",
+                        to="refbooks.refbookversion",
+                        verbose_name="Версия справочника",
+                    ),
+                ),
+                (
+                    "element",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="memberships",
+                        to="refbooks.sharedrefbookelement",
+                        verbose_name="Элемент общего хранилища",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Элемент версии (общее хранилище)",
+                "verbose_name_plural": "Элементы версии (общее хранилище)",
+                "unique_together": {("version", "element")},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0003_shared_element_storage"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="refbookversion",
+            index=models.Index(
+                fields=["refbook", "date"], name="refbooks_version_date_idx"
+            ),
+        ),
+    ]
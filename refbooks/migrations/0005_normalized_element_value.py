@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+def normalize_value(value):
+    # Копия refbooks.models.normalize_value на момент создания миграции
+    return " ".join(value.casefold().replace("ё", "е").split())
+
+
+def fill_normalized_values(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for model_name in ("RefBookElement", "SharedRefBookElement"):
+        model = apps.get_model("refbooks", model_name)
+        manager = model.objects.using(db_alias)
+        last_pk = 0
+        while True:
+            # Пакеты по первичному ключу, чтобы не загружать всю таблицу в память
+            objs = list(
+                manager.filter(pk__gt=last_pk).order_by("pk").only("id", "value")[:500]
+            )
+            if not objs:
+                break
+            for obj in objs:
+                obj.normalized_value = normalize_value(obj.value)
+            manager.bulk_update(objs, ["normalized_value"])
+            last_pk = objs[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0004_refbook_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbookelement",
+            name="normalized_value",
+            field=models.CharField(
+                default="",
+                editable=False,
+                max_length=300,
+                verbose_name="Нормализованное значение элемента",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="sharedrefbookelement",
+            name="normalized_value",
+            field=models.CharField(
+                default="",
+                editable=False,
+                max_length=300,
+                verbose_name="Нормализованное значение элемента",
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_normalized_values, migrations.RunPython.noop),
+    ]
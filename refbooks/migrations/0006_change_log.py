@@ -0,0 +1,169 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _batches(queryset, *fields):
+    # Пакеты по первичному ключу, чтобы не загружать всю таблицу в память
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by("pk").values_list("pk", *fields)[:BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+def seed_change_log(apps, schema_editor):
+    """
+    Записывает в журнал создание существующих справочников, версий и элементов,
+    чтобы новая реплика получила все данные, начиная с since=0.
+    Формат данных совпадает с refbooks.changes на момент создания миграции.
+    """
+    db_alias = schema_editor.connection.alias
+    if db_alias != "default":
+        return
+    RefBook = apps.get_model("refbooks", "RefBook")
+    RefBookVersion = apps.get_model("refbooks", "RefBookVersion")
+    RefBookElement = apps.get_model("refbooks", "RefBookElement")
+    RefBookVersionElement = apps.get_model("refbooks", "RefBookVersionElement")
+    RefBookChange = apps.get_model("refbooks", "RefBookChange")
+    changes = RefBookChange.objects.using(db_alias)
+
+    def create(object_type, object_id, refbook_id, version_id, data):
+        return RefBookChange(
+            object_type=object_type,
+            action="create",
+            object_id=object_id,
+            refbook_id=refbook_id,
+            version_id=version_id,
+            data=data,
+        )
+
+    for rows in _batches(RefBook.objects.using(db_alias), "code", "name", "description"):
+        changes.bulk_create([
+            create("refbook", pk, pk, None, {"code": code, "name": name, "description": description})
+            for pk, code, name, description in rows
+        ])
+
+    version_refbooks = {}
+    for rows in _batches(RefBookVersion.objects.using(db_alias), "refbook_id", "version", "date", "shared_storage"):
+        changes.bulk_create([
+            create("version", pk, refbook_id, pk, {
+                "refbook_id": refbook_id,
+                "version": version,
+                "date": version_date.isoformat(),
+                "shared_storage": shared_storage,
+            })
+            for pk, refbook_id, version, version_date, shared_storage in rows
+        ])
+        version_refbooks.update((pk, refbook_id) for pk, refbook_id, *_ in rows)
+
+    for rows in _batches(RefBookElement.objects.using(db_alias), "version_id", "code", "value"):
+        changes.bulk_create([
+            create("element", pk, version_refbooks[version_id], version_id, {
+                "version_id": version_id, "code": code, "value": value
+            })
+            for pk, version_id, code, value in rows
+        ])
+
+    memberships = RefBookVersionElement.objects.using(db_alias)
+    for rows in _batches(memberships, "version_id", "element__code", "element__value"):
+        changes.bulk_create([
+            create("version_element", pk, version_refbooks[version_id], version_id, {
+                "version_id": version_id, "code": code, "value": value
+            })
+            for pk, version_id, code, value in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0005_normalized_element_value"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RefBookChange",
+            fields=[
+                (
+                    "seq",
+                    models.BigAutoField(
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Порядковый номер",
+                    ),
+                ),
+                (
+                    "object_type",
+                    models.CharField(
+                        choices=[
+                            ("refbook", "Справочник"),
+                            ("version", "Версия справочника"),
+                            ("element", "Элемент справочника"),
+                            ("version_element", "Элемент версии (общее хранилище)"),
+                        ],
+                        max_length=20,
+                        verbose_name="Тип объекта",
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("create", "Создание"),
+                            ("update", "Изменение"),
+                            ("delete", "Удаление"),
+                        ],
+                        max_length=10,
+                        verbose_name="Действие",
+                    ),
+                ),
+                (
+                    "object_id",
+                    models.BigIntegerField(verbose_name="Идентификатор объекта"),
+                ),
+                (
+                    "refbook_id",
+                    models.BigIntegerField(
+                        blank=True, null=True, verbose_name="Идентификатор справочника"
+                    ),
+                ),
+                (
+                    "version_id",
+                    models.BigIntegerField(
+                        blank=True,
+                        db_index=True,
+                        null=True,
+                        verbose_name="Идентификатор версии справочника",
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Данные объекта"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Время изменения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение справочника",
+                "verbose_name_plural": "Журнал изменений справочников",
+                "ordering": ["seq"],
+                "indexes": [
+                    models.Index(
+                        fields=["refbook_id", "seq"], name="refbooks_change_refbook_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0006_change_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbook",
+            name="shard",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=50,
+                verbose_name="Шард",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0007_refbook_shard"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="refbookelement",
+            index=models.Index(
+                fields=["code", "version"], name="refbooks_element_code_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+def normalize_value(value):
+    # Копия refbooks.normalization.normalize_value на момент создания миграции
+    return " ".join(value.casefold().replace("ё", "е").split())
+
+
+def fill_search_columns(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    RefBook = apps.get_model("refbooks", "RefBook")
+    refbooks = list(RefBook.objects.using(db_alias).only("id", "code", "name"))
+    for refbook in refbooks:
+        refbook.search_code = normalize_value(refbook.code)
+        refbook.search_name = normalize_value(refbook.name)
+    RefBook.objects.using(db_alias).bulk_update(
+        refbooks, ["search_code", "search_name"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0009_background_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbook",
+            name="search_code",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=100,
+                verbose_name="Нормализованный код для поиска",
+            ),
+        ),
+        migrations.AddField(
+            model_name="refbook",
+            name="search_name",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=300,
+                verbose_name="Нормализованное наименование для поиска",
+            ),
+        ),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0010_refbook_search_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbookchange",
+            name="source_db",
+            field=models.CharField(
+                blank=True, default="", max_length=50, verbose_name="Шард"
+            ),
+        ),
+        migrations.AddField(
+            model_name="refbookchange",
+            name="source_seq",
+            field=models.BigIntegerField(
+                blank=True, null=True, verbose_name="Порядковый номер в журнале шарда"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="refbookchange",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Время изменения"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="refbookchange",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("source_seq__isnull", False)),
+                fields=("source_db", "source_seq"),
+                name="refbooks_change_source_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0011_shard_change_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbookversion",
+            name="is_ready",
+            field=models.BooleanField(default=True, verbose_name="Загрузка завершена"),
+        ),
+    ]
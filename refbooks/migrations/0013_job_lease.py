@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0012_version_is_ready"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="refbookjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Последний сигнал исполнителя"
+            ),
+        ),
+        migrations.AddField(
+            model_name="refbookjob",
+            name="worker",
+            field=models.CharField(
+                blank=True, max_length=100, verbose_name="Процесс-исполнитель"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("refbooks", "0013_job_lease"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="refbookversionelement",
+            name="version",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="shared_memberships",
+                to="refbooks.refbookversion",
+                verbose_name="Версия справочника",
+            ),
+        ),
+    ]
@@ -1,7 +1,89 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from refbooks.normalization import normalize_value
 
 # Create your models here.
 
+
+class NormalizedValueQuerySet(models.QuerySet):
+
+    """
+    QuerySet для моделей элементов с полем normalized_value.
+    Массовые операции заполняют нормализованное значение, так как save() при них не вызывается.
+    """
+
+    def create(self, **kwargs):
+        """
+        Если БД не выбрана явно, ее определяет роутер по создаваемому объекту,
+        чтобы элемент версии справочника из шарда сохранялся в шард.
+        """
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalized_value = normalize_value(obj.value)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if 'value' in fields:
+            for obj in objs:
+                obj.normalized_value = normalize_value(obj.value)
+            if 'normalized_value' not in fields:
+                fields.append('normalized_value')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
+class ChangeLoggedQuerySet(models.QuerySet):
+
+    """
+    QuerySet для элементов, удаление которых записывается в журнал изменений (refbooks.changes).
+    Удаляемые строки записываются в журнал пакетно, а сами удаляются одним DELETE: обработчиков
+    post_delete у элементов нет, поэтому Django не загружает их по одной.
+    """
+
+    def delete(self):
+        from refbooks.changes import record_deletes
+
+        with transaction.atomic(using=self.db):
+            record_deletes(self)
+            return super().delete()
+
+    def delete_unlogged(self):
+        """
+        Удаление без записи в журнал: для переноса элементов между БД, не меняющего их содержимого.
+        """
+        return super().delete()
+
+
+class RefBookElementQuerySet(ChangeLoggedQuerySet, NormalizedValueQuerySet):
+    pass
+
+
+class ChangeLoggedModelMixin:
+
+    """
+    Элемент и запись журнала о нем (обработчик post_save) сохраняются в одной транзакции БД элемента.
+    Удаление отдельного элемента проходит через ChangeLoggedQuerySet.delete.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        return type(self).objects.using(using).filter(pk=self.pk).delete()
+
+
 class RefBook(models.Model):
 
     """
@@ -24,6 +106,27 @@ class RefBook(models.Model):
         blank=True,
         verbose_name="Описание"
     )
+    shard = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name="Шард"
+    )
+    search_code = models.CharField(
+        max_length=100,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="Нормализованный код для поиска"
+    )
+    search_name = models.CharField(
+        max_length=300,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="Нормализованное наименование для поиска"
+    )
 
     class Meta:
         verbose_name = "Справочник"
@@ -32,6 +135,21 @@ class RefBook(models.Model):
     def __str__(self):
         return f"{self.code} - {self.name} - {self.description[:20]}..."
 
+    def save(self, *args, **kwargs):
+        self.search_code = normalize_value(self.code)
+        self.search_name = normalize_value(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'code', 'name'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_code', 'search_name'}
+        super().save(*args, **kwargs)
+
+    @property
+    def db_alias(self):
+        """
+        Алиас БД, в которой хранятся элементы версий справочника.
+        """
+        return self.shard or 'default'
+
 
 class RefBookVersion(models.Model):
 
@@ -41,6 +159,8 @@ class RefBookVersion(models.Model):
         - Идентификатор справочника (обязательно для заполнения)
         - Версия (строка, 50 символов, обязательно для заполнения)
         - Дата начала действия версии (дата)
+        - Признак завершения загрузки: версия, элементы которой еще загружаются, не используется
+          при выборе версии справочника
     """
     refbook = models.ForeignKey(
         RefBook,
@@ -58,14 +178,45 @@ class RefBookVersion(models.Model):
         verbose_name="Дата начала действия версии"
     )
 
+    shared_storage = models.BooleanField(
+        default=False,
+        verbose_name="Элементы в общем хранилище"
+    )
+
+    is_ready = models.BooleanField(
+        default=True,
+        verbose_name="Загрузка завершена"
+    )
+
     class Meta:
         verbose_name = "Версия справочника"
         verbose_name_plural = "Версии справочника"
+        indexes = [
+            models.Index(fields=['refbook', 'date'], name='refbooks_version_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.refbook.name} - {self.version} - {self.date}..."
 
-class RefBookElement(models.Model):
+    @property
+    def elements_db(self):
+        """
+        Алиас БД, в которой хранятся элементы версии (шард справочника).
+        """
+        return self.refbook.db_alias
+
+    def get_elements(self):
+        """
+        Элементы версии независимо от режима хранения.
+        Возвращает QuerySet объектов с полями code и value.
+        """
+        if self.shared_storage:
+            return SharedRefBookElement.objects.using(self.elements_db).filter(
+                memberships__version_id=self.pk
+            )
+        return RefBookElement.objects.using(self.elements_db).filter(version_id=self.pk)
+
+class RefBookElement(ChangeLoggedModelMixin, models.Model):
 
     """
     "Элемент справочника":
@@ -89,11 +240,328 @@ class RefBookElement(models.Model):
         max_length=300,
         verbose_name="Значение элемента"
     )
+    normalized_value = models.CharField(
+        max_length=300,
+        editable=False,
+        verbose_name="Нормализованное значение элемента"
+    )
+
+    objects = RefBookElementQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Элемент справочника"
         verbose_name_plural = "Элементы справочника"
         unique_together = [('version', 'code')]
+        indexes = [
+            models.Index(fields=['code', 'version'], name='refbooks_element_code_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.code} - {self.value}"
\ No newline at end of file
+        return f"{self.code} - {self.value}"
+
+    def save(self, *args, **kwargs):
+        self.normalized_value = normalize_value(self.value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_value'}
+        super().save(*args, **kwargs)
+
+
+class SharedRefBookElement(models.Model):
+
+    """
+    Элемент общего хранилища:
+        - Идентификатор
+        - Код элемента (строка, 100 символов, обязательно для заполнения)
+        - Значение элемента (строка, 300 символов, обязательно для заполнения)
+
+    Одинаковая пара (код, значение) хранится один раз и используется всеми версиями,
+    элементы которых переведены в общее хранилище.
+    """
+    code = models.CharField(
+        max_length=100,
+        verbose_name="Код элемента"
+    )
+    value = models.CharField(
+        max_length=300,
+        verbose_name="Значение элемента"
+    )
+    normalized_value = models.CharField(
+        max_length=300,
+        editable=False,
+        verbose_name="Нормализованное значение элемента"
+    )
+
+    objects = NormalizedValueQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Элемент общего хранилища"
+        verbose_name_plural = "Элементы общего хранилища"
+        unique_together = [('code', 'value')]
+
+    def __str__(self):
+        return f"{self.code} - {self.value}"
+
+    def save(self, *args, **kwargs):
+        self.normalized_value = normalize_value(self.value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_value'}
+        super().save(*args, **kwargs)
+
+
+class RefBookVersionElement(ChangeLoggedModelMixin, models.Model):
+
+    """
+    Принадлежность элемента общего хранилища версии справочника:
+        - Идентификатор
+        - Идентификатор Версии справочника (обязательно для заполнения)
+        - Идентификатор Элемента общего хранилища (обязательно для заполнения)
+    """
+    # Отдельный индекс по version не нужен: version - первый столбец уникального индекса (version, element)
+    version = models.ForeignKey(
+        RefBookVersion,
+        on_delete=models.CASCADE,
+        related_name='shared_memberships',
+        db_index=False,
+        verbose_name="Версия справочника"
+    )
+    element = models.ForeignKey(
+        SharedRefBookElement,
+        on_delete=models.PROTECT,
+        related_name='memberships',
+        verbose_name="Элемент общего хранилища"
+    )
+
+    objects = ChangeLoggedQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Элемент версии (общее хранилище)"
+        verbose_name_plural = "Элементы версии (общее хранилище)"
+        unique_together = [('version', 'element')]
+
+    def __str__(self):
+        return f"{self.version_id} - {self.element}"
+
+
+class RefBookChange(models.Model):
+
+    """
+    Запись журнала изменений справочников:
+        - Порядковый номер (монотонно возрастает, не переиспользуется)
+        - Тип объекта (справочник, версия, элемент, элемент версии в общем хранилище)
+        - Действие (создание, изменение, удаление)
+        - Идентификатор объекта
+        - Идентификаторы справочника и версии, к которым относится объект
+        - Данные объекта после изменения
+        - Время изменения
+        - Шард и порядковый номер в журнале шарда (для записей, перенесенных из шарда)
+
+    Идентификаторы элементов уникальны только в пределах одной БД, поэтому элементы
+    в журнале определяются парой (version_id, code) из данных изменения.
+    """
+    OBJECT_REFBOOK = 'refbook'
+    OBJECT_VERSION = 'version'
+    OBJECT_ELEMENT = 'element'
+    OBJECT_VERSION_ELEMENT = 'version_element'
+    OBJECT_TYPE_CHOICES = [
+        (OBJECT_REFBOOK, "Справочник"),
+        (OBJECT_VERSION, "Версия справочника"),
+        (OBJECT_ELEMENT, "Элемент справочника"),
+        (OBJECT_VERSION_ELEMENT, "Элемент версии (общее хранилище)"),
+    ]
+
+    ACTION_CREATE = 'create'
+    ACTION_UPDATE = 'update'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = [
+        (ACTION_CREATE, "Создание"),
+        (ACTION_UPDATE, "Изменение"),
+        (ACTION_DELETE, "Удаление"),
+    ]
+
+    seq = models.BigAutoField(
+        primary_key=True,
+        verbose_name="Порядковый номер"
+    )
+    object_type = models.CharField(
+        max_length=20,
+        choices=OBJECT_TYPE_CHOICES,
+        verbose_name="Тип объекта"
+    )
+    action = models.CharField(
+        max_length=10,
+        choices=ACTION_CHOICES,
+        verbose_name="Действие"
+    )
+    object_id = models.BigIntegerField(
+        verbose_name="Идентификатор объекта"
+    )
+    refbook_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Идентификатор справочника"
+    )
+    version_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name="Идентификатор версии справочника"
+    )
+    data = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Данные объекта"
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Время изменения"
+    )
+    source_db = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        verbose_name="Шард"
+    )
+    source_seq = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Порядковый номер в журнале шарда"
+    )
+
+    class Meta:
+        verbose_name = "Изменение справочника"
+        verbose_name_plural = "Журнал изменений справочников"
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['refbook_id', 'seq'], name='refbooks_change_refbook_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_db', 'source_seq'],
+                condition=models.Q(source_seq__isnull=False),
+                name='refbooks_change_source_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.seq} - {self.object_type} {self.object_id} - {self.action}"
+
+
+class RefBookJob(models.Model):
+
+    """
+    Фоновая задача (загрузка версии справочника, перестроение производных данных):
+        - Идентификатор
+        - Тип задачи
+        - Статус
+        - Справочник (необязательно)
+        - Параметры задачи
+        - Количество обработанных и общее количество записей
+        - Результат или текст ошибки
+        - Время создания, запуска и завершения
+        - Процесс, выполняющий задачу, и время его последнего сигнала (по нему определяются
+          задачи, процесс которых остановился)
+    """
+    KIND_IMPORT_VERSION = 'import_version'
+    KIND_REBUILD_NORMALIZED = 'rebuild_normalized'
+    KIND_CHOICES = [
+        (KIND_IMPORT_VERSION, "Загрузка версии справочника"),
+        (KIND_REBUILD_NORMALIZED, "Перестроение нормализованных значений"),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "В очереди"),
+        (STATUS_RUNNING, "Выполняется"),
+        (STATUS_DONE, "Завершена"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    kind = models.CharField(
+        max_length=30,
+        choices=KIND_CHOICES,
+        verbose_name="Тип задачи"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    refbook = models.ForeignKey(
+        RefBook,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name="Справочник"
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Параметры задачи"
+    )
+    total = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Всего записей"
+    )
+    processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Обработано записей"
+    )
+    result = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Результат"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Время создания"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Время запуска"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Время завершения"
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Процесс-исполнитель"
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Последний сигнал исполнителя"
+    )
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.pk} - {self.get_kind_display()} - {self.get_status_display()}"
+
+    @property
+    def progress(self):
+        """
+        Доля выполненной работы в процентах.
+        """
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.processed * 100 // self.total)
@@ -0,0 +1,9 @@
+def normalize_value(value):
+    """
+    Нормализованная форма значения элемента для нечувствительного сравнения:
+    регистр не учитывается, ё приравнивается к е, пробелы по краям убираются,
+    а повторяющиеся пробельные символы внутри схлопываются в один пробел.
+
+    Модуль не зависит от Django и используется также клиентом (refbooks.client).
+    """
+    return ' '.join(value.casefold().replace('ё', 'е').split())
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RefBookCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация списка справочников.
+    Стоимость перехода на следующую страницу не зависит от ее номера.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def is_requested(self, request):
+        """
+        Пагинация включается, только если клиент передал cursor или page_size,
+        чтобы формат ответа без этих параметров остался прежним.
+        """
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
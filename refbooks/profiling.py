@@ -0,0 +1,100 @@
+"""
+Профилирование запросов с помощью cProfile.
+
+Включается настройкой REFBOOKS_PROFILING_ENABLED. Профилируется запрос, в заголовке
+REFBOOKS_PROFILING_HEADER (по умолчанию X-Profile) которого передан секрет REFBOOKS_PROFILING_SECRET
+(без секрета заголовок не учитывается), или случайная доля запросов REFBOOKS_PROFILING_SAMPLE_RATE.
+Профили сохраняются в REFBOOKS_PROFILING_DIR, хранится не больше REFBOOKS_PROFILING_MAX_PROFILES
+последних профилей. Просмотреть самые медленные запросы можно командой `python manage.py refbook_profiles`.
+"""
+import cProfile
+import hmac
+import random
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_SUFFIX = '.prof'
+PROFILE_NAME_RE = re.compile(
+    r'^(?P<timestamp>\d+)__(?P<duration>\d+)ms__(?P<method>[A-Z]+)__(?P<path>.*)\.prof$'
+)
+
+
+def get_profile_dir():
+    return Path(settings.REFBOOKS_PROFILING_DIR)
+
+
+def build_profile_name(timestamp, duration_ms, method, path):
+    path_slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', path).strip('_')[:100] or 'root'
+    return f"{int(timestamp * 1000)}__{duration_ms}ms__{method}__{path_slug}{PROFILE_SUFFIX}"
+
+
+def parse_profile_name(name):
+    """
+    Разбирает имя файла профиля. Возвращает словарь или None для посторонних файлов.
+    """
+    match = PROFILE_NAME_RE.match(name)
+    if match is None:
+        return None
+    return {
+        'timestamp': int(match['timestamp']) / 1000,
+        'duration_ms': int(match['duration']),
+        'method': match['method'],
+        'path': match['path'],
+    }
+
+
+class ProfilingMiddleware:
+    """
+    Оборачивает обработку запроса (view, сериализацию и рендеринг ответа) в cProfile.
+    Если профилирование выключено, middleware исключается из цепочки при старте.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REFBOOKS_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.header = settings.REFBOOKS_PROFILING_HEADER
+        self.secret = settings.REFBOOKS_PROFILING_SECRET
+        self.max_profiles = settings.REFBOOKS_PROFILING_MAX_PROFILES
+        self.sample_rate = settings.REFBOOKS_PROFILING_SAMPLE_RATE
+        self.profile_dir = get_profile_dir()
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+
+    def should_profile(self, request):
+        value = request.headers.get(self.header)
+        if value and self.secret and hmac.compare_digest(value.encode(), self.secret.encode()):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.time()
+        response = profiler.runcall(self.get_response, request)
+        duration_ms = int((time.time() - started) * 1000)
+
+        name = build_profile_name(started, duration_ms, request.method, request.path)
+        profiler.dump_stats(self.profile_dir / name)
+        self.remove_old_profiles()
+        response['X-Profile-Id'] = name
+        return response
+
+    def remove_old_profiles(self):
+        """
+        Удаляет самые старые профили сверх REFBOOKS_PROFILING_MAX_PROFILES.
+        """
+        profiles = []
+        for file in self.profile_dir.iterdir():
+            info = parse_profile_name(file.name)
+            if info is not None:
+                profiles.append((info['timestamp'], file))
+        profiles.sort()
+        for _, file in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            file.unlink(missing_ok=True)
@@ -0,0 +1,61 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # msgpack - необязательная зависимость
+    msgpack = None
+
+
+def to_columns(data, columns=None):
+    """
+    Преобразует ответ со списком строк в колоночный вид.
+    {"elements": [{"code": "1", "value": "A"}]} -> {"codes": ["1"], "values": ["A"]}
+
+    Остальные ключи ответа (next, previous, count) сохраняются как есть.
+    Если список пуст, набор колонок берется из columns.
+    """
+    if not isinstance(data, dict):
+        return data
+
+    result = {}
+    for key, item in data.items():
+        if isinstance(item, list) and all(isinstance(row, dict) for row in item):
+            names = list(item[0]) if item else list(columns or [])
+            for name in names:
+                result[f"{name}s"] = [row.get(name) for row in item]
+        else:
+            result[key] = item
+    return result
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    JSON в колоночном виде: ключи полей не повторяются для каждой строки.
+    Выбирается заголовком Accept: application/vnd.refbooks.columnar+json или параметром format=columnar.
+    Набор колонок для пустого ответа view может задать атрибутом columnar_fields.
+    """
+    media_type = 'application/vnd.refbooks.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        view = (renderer_context or {}).get('view')
+        columns = getattr(view, 'columnar_fields', None)
+        return super().render(to_columns(data, columns), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Бинарный формат MessagePack.
+    Выбирается заголовком Accept: application/x-msgpack или параметром format=msgpack.
+    Требует установленного пакета msgpack.
+    """
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=JSONEncoder().default)
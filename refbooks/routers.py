@@ -0,0 +1,54 @@
+from django.conf import settings
+
+from refbooks.models import (
+    RefBookVersion, RefBookElement, SharedRefBookElement, RefBookVersionElement
+)
+
+ELEMENT_MODELS = (RefBookElement, SharedRefBookElement, RefBookVersionElement)
+
+
+class RefBookShardRouter:
+    """
+    Роутер шардов справочников.
+
+    Справочники, версии и общий журнал изменений всегда хранятся в основной БД.
+    Элементы версий (обычные и из общего хранилища) хранятся в БД шарда справочника.
+    В шарде также лежат копии строк справочника и его версий, нужные для внешних ключей элементов,
+    и журнал изменений элементов шарда (запись в него выполняется явно через .using()).
+
+    БД элемента определяется по объекту (элементу или версии), переданному Django в подсказке instance.
+    Запросы без подсказки, например RefBookElement.objects.filter(version_id=...), выполняются
+    в основной БД, поэтому код, работающий с элементами конкретного справочника, выбирает БД явно:
+    version.get_elements(), version.elements или .using(refbook.db_alias).
+    """
+
+    def _db_for_element(self, model, instance):
+        if isinstance(instance, RefBookVersion):
+            return instance.elements_db
+        if isinstance(instance, ELEMENT_MODELS):
+            if instance._state.db:
+                return instance._state.db
+            # Новый элемент: БД шарда определяется по версии, даже если задан только version_id
+            if isinstance(instance, (RefBookElement, RefBookVersionElement)) and instance.version_id is not None:
+                return instance.version.elements_db
+        return None
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'refbooks':
+            return None
+        if model in ELEMENT_MODELS:
+            return self._db_for_element(model, hints.get('instance'))
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == 'refbooks' and obj2._meta.app_label == 'refbooks':
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REFBOOKS_SHARDS:
+            return app_label == 'refbooks'
+        return None
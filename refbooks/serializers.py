@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from refbooks.models import RefBook, RefBookElement
+from refbooks.models import RefBook, RefBookElement, RefBookChange, RefBookJob
 
 
 class RefBookSerializer(serializers.ModelSerializer):
@@ -11,8 +11,83 @@ class RefBookSerializer(serializers.ModelSerializer):
         model = RefBook
         fields = ['id', 'code', 'name']
 
+    def __init__(self, *args, **kwargs):
+        """
+        Необязательный аргумент fields ограничивает набор полей в ответе.
+        """
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
 
 class RefBookElementSerializer(serializers.ModelSerializer):
     class Meta:
         model = RefBookElement
-        fields = ['code', 'value']
\ No newline at end of file
+        fields = ['code', 'value']
+
+
+class RefBookChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RefBookChange
+        fields = ['seq', 'object_type', 'action', 'object_id', 'refbook_id', 'version_id', 'data', 'created_at']
+
+
+class DocumentValidationSerializer(serializers.Serializer):
+    document = serializers.DictField(
+        help_text="Проверяемый документ"
+    )
+    fields = serializers.DictField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        help_text="Пути к кодированным полям и коды справочников, например {\"diagnoses.*\": \"ICD-10\"}"
+    )
+    date = serializers.DateField(
+        required=False,
+        help_text="Дата, на которую выбираются версии справочников (по умолчанию текущая)"
+    )
+    normalized = serializers.BooleanField(
+        default=False,
+        help_text="Сравнивать значения без учета регистра, ё/е и лишних пробелов"
+    )
+
+
+class RefBookJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RefBookJob
+        fields = [
+            'id', 'kind', 'status', 'refbook', 'total', 'processed', 'progress', 'result', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+
+
+class ImportElementSerializer(serializers.Serializer):
+    code = serializers.CharField(max_length=100)
+    value = serializers.CharField(max_length=300)
+
+
+class VersionImportSerializer(serializers.Serializer):
+    version = serializers.CharField(
+        max_length=50,
+        help_text="Номер версии"
+    )
+    date = serializers.DateField(
+        help_text="Дата начала действия версии"
+    )
+    elements = ImportElementSerializer(
+        many=True,
+        allow_empty=False,
+        help_text="Элементы версии"
+    )
+    shared_storage = serializers.BooleanField(
+        default=False,
+        help_text="Сохранить элементы в общем хранилище"
+    )
+
+    def validate_elements(self, elements):
+        codes = [element['code'] for element in elements]
+        if len(codes) != len(set(codes)):
+            raise serializers.ValidationError("Коды элементов в пределах версии должны быть уникальны")
+        return elements
@@ -0,0 +1,143 @@
+"""
+Перенос элементов справочников между шардами.
+
+Справочники и версии всегда хранятся в основной БД. Элементы справочника с заполненным полем shard
+хранятся в отдельном файле SQLite шарда, куда также копируются строки справочника и его версий,
+чтобы внешние ключи элементов оставались корректными. Изменения элементов шарда записываются
+в журнал изменений шарда (refbooks.changes).
+
+Перенос не меняет содержимого справочника и не записывается в журнал изменений.
+"""
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+
+from refbooks.changes import collect_changes
+from refbooks.models import RefBook, RefBookVersion, RefBookElement, RefBookVersionElement
+from refbooks.storage import BATCH_SIZE, get_shared_elements, delete_orphan_shared_elements
+
+
+def get_db_aliases():
+    """
+    Все БД, в которых могут храниться элементы справочников.
+    """
+    return ['default', *settings.REFBOOKS_SHARDS]
+
+
+def prepare_shard(shard):
+    """
+    Создает файл шарда и применяет к нему миграции приложения.
+    """
+    settings.REFBOOKS_SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    call_command('migrate', 'refbooks', database=shard, verbosity=0)
+
+
+def sync_refbook_mirror(refbook, using):
+    RefBook.objects.using(using).update_or_create(
+        pk=refbook.pk,
+        defaults={'code': refbook.code, 'name': refbook.name, 'description': refbook.description},
+    )
+
+
+def sync_version_mirror(version, using=None):
+    """
+    Обновляет копию версии в шарде справочника. Для справочников без шарда ничего не делает.
+    """
+    using = using or version.elements_db
+    if using == 'default':
+        return
+    RefBookVersion.objects.using(using).update_or_create(
+        pk=version.pk,
+        defaults={
+            'refbook_id': version.refbook_id,
+            'version': version.version,
+            'date': version.date,
+            'shared_storage': version.shared_storage,
+            'is_ready': version.is_ready,
+        },
+    )
+
+
+def delete_version_mirror(version):
+    """
+    Удаляет копию версии в шарде вместе с ее элементами.
+    """
+    if version.elements_db != 'default':
+        RefBookVersion.objects.using(version.elements_db).filter(pk=version.pk).delete()
+
+
+def _copy_version_elements(version, source, target):
+    if version.shared_storage:
+        pairs = list(
+            RefBookVersionElement.objects.using(source).filter(
+                version_id=version.pk
+            ).values_list('element__code', 'element__value')
+        )
+        RefBookVersionElement.objects.using(target).filter(version_id=version.pk).delete_unlogged()
+        shared = get_shared_elements(pairs, target)
+        RefBookVersionElement.objects.using(target).bulk_create(
+            [RefBookVersionElement(version_id=version.pk, element=shared[pair]) for pair in pairs],
+            batch_size=BATCH_SIZE,
+        )
+    else:
+        pairs = list(
+            RefBookElement.objects.using(source).filter(
+                version_id=version.pk
+            ).values_list('code', 'value')
+        )
+        RefBookElement.objects.using(target).filter(version_id=version.pk).delete_unlogged()
+        RefBookElement.objects.using(target).bulk_create(
+            [RefBookElement(version_id=version.pk, code=code, value=value) for code, value in pairs],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def lock_for_write(refbook, using):
+    """
+    Начинает запись в текущей транзакции БД using: до ее завершения SQLite не дает
+    другим соединениям писать в эту БД.
+    """
+    RefBook.objects.using(using).filter(pk=refbook.pk).update(shard=F('shard'))
+
+
+def move_refbook(refbook, target):
+    """
+    Переносит элементы всех версий справочника в БД target ('default' или имя шарда).
+
+    Исходная БД заблокирована для записи от копирования элементов до их удаления,
+    поэтому изменения, сделанные во время переноса, не теряются: они ждут его завершения.
+    """
+    source = refbook.db_alias
+    if target == source:
+        return
+    if target not in get_db_aliases():
+        raise ValueError(f"Неизвестный шард: {target}")
+
+    if target != 'default':
+        prepare_shard(target)
+
+    with transaction.atomic(using=source):
+        lock_for_write(refbook, source)
+        versions = list(RefBookVersion.objects.filter(refbook=refbook))
+
+        with transaction.atomic(using=target):
+            if target != 'default':
+                sync_refbook_mirror(refbook, target)
+            for version in versions:
+                sync_version_mirror(version, target)
+                _copy_version_elements(version, source, target)
+
+        # Записи журнала исходного шарда переносятся в основную БД, пока справочник еще хранится в нем
+        if source != 'default':
+            collect_changes(source)
+
+        refbook.shard = '' if target == 'default' else target
+        refbook.save(update_fields=['shard'])
+
+        version_ids = [version.pk for version in versions]
+        RefBookVersionElement.objects.using(source).filter(version_id__in=version_ids).delete_unlogged()
+        RefBookElement.objects.using(source).filter(version_id__in=version_ids).delete_unlogged()
+        if source != 'default':
+            RefBook.objects.using(source).filter(pk=refbook.pk).delete()
+        delete_orphan_shared_elements(using=source)
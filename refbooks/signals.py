@@ -0,0 +1,92 @@
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from refbooks.changes import get_version_refbook_id, record_change
+from refbooks.models import (
+    RefBook, RefBookVersion, RefBookElement, RefBookVersionElement, RefBookChange
+)
+from refbooks.sharding import sync_version_mirror, delete_version_mirror
+
+REFBOOKS_GENERATION_KEY = 'refbooks:generation'
+
+
+def get_refbooks_generation():
+    """
+    Номер поколения списка справочников. Входит в ключи кэша,
+    поэтому его увеличение делает устаревшими все закэшированные подсчеты.
+    Начальное значение берется из времени, чтобы после вытеснения ключа
+    не совпасть с одним из прежних поколений.
+    """
+    return cache.get_or_set(REFBOOKS_GENERATION_KEY, time.time_ns, timeout=None)
+
+
+def is_shard_mirror(sender, using):
+    """
+    Копии справочников и версий в шардах нужны только для внешних ключей элементов
+    и не считаются изменениями справочников.
+    """
+    return sender in (RefBook, RefBookVersion) and using != 'default'
+
+
+@receiver(post_save, sender=RefBook)
+@receiver(post_delete, sender=RefBook)
+@receiver(post_save, sender=RefBookVersion)
+@receiver(post_delete, sender=RefBookVersion)
+def bump_refbooks_generation(sender, using, **kwargs):
+    if is_shard_mirror(sender, using):
+        return
+    try:
+        cache.incr(REFBOOKS_GENERATION_KEY)
+    except ValueError:
+        cache.set(REFBOOKS_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+@receiver(post_save, sender=RefBook)
+@receiver(post_save, sender=RefBookVersion)
+@receiver(post_save, sender=RefBookElement)
+@receiver(post_save, sender=RefBookVersionElement)
+def record_saved_change(sender, instance, created, using, raw=False, **kwargs):
+    if raw or is_shard_mirror(sender, using):
+        return
+    if sender is RefBookVersion:
+        get_version_refbook_id.cache_clear()
+    # Изменение элемента записывается в журнал БД элемента (основной или шарда)
+    record_change(
+        instance, RefBookChange.ACTION_CREATE if created else RefBookChange.ACTION_UPDATE, using=using
+    )
+
+
+# Удаление элементов записывается пакетно в ChangeLoggedQuerySet.delete: обработчик post_delete
+# у элементов отключил бы быстрое удаление одним запросом
+@receiver(post_delete, sender=RefBook)
+@receiver(post_delete, sender=RefBookVersion)
+def record_deleted_change(sender, instance, using, **kwargs):
+    if is_shard_mirror(sender, using):
+        return
+    record_change(instance, RefBookChange.ACTION_DELETE)
+    if sender is RefBookVersion:
+        get_version_refbook_id.cache_clear()
+
+
+@receiver(post_save, sender=RefBookVersion)
+def sync_shard_version(sender, instance, using, raw=False, **kwargs):
+    if raw or using != 'default':
+        return
+    sync_version_mirror(instance)
+
+
+@receiver(post_delete, sender=RefBookVersion)
+def delete_shard_version(sender, instance, using, **kwargs):
+    if using != 'default':
+        return
+    delete_version_mirror(instance)
+
+
+@receiver(post_delete, sender=RefBook)
+def delete_shard_refbook(sender, instance, using, **kwargs):
+    if using != 'default' or instance.db_alias == 'default':
+        return
+    RefBook.objects.using(instance.db_alias).filter(pk=instance.pk).delete()
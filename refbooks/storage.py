@@ -0,0 +1,99 @@
+"""
+Перевод элементов версий справочника между режимами хранения.
+
+Обычный режим: каждая версия хранит собственную копию элементов в RefBookElement.
+Общее хранилище: одинаковые пары (код, значение) хранятся один раз в SharedRefBookElement,
+а версия ссылается на них через компактную таблицу RefBookVersionElement.
+
+Для журнала изменений перенос выглядит как удаление элементов одного типа и создание другого.
+Удаление записывается первым, так как элемент в журнале определяется парой (version_id, code).
+"""
+from django.db import transaction
+
+from refbooks.changes import record_changes
+from refbooks.models import (
+    RefBookChange, RefBookElement, RefBookVersionElement, SharedRefBookElement
+)
+
+BATCH_SIZE = 500
+
+
+def get_shared_elements(pairs, using):
+    """
+    Создает недостающие элементы общего хранилища и возвращает словарь {(code, value): элемент}.
+    """
+    SharedRefBookElement.objects.using(using).bulk_create(
+        [SharedRefBookElement(code=code, value=value) for code, value in pairs],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    wanted = set(pairs)
+    codes = sorted({code for code, _ in wanted})
+    elements = {}
+    for start in range(0, len(codes), BATCH_SIZE):
+        rows = SharedRefBookElement.objects.using(using).filter(
+            code__in=codes[start:start + BATCH_SIZE]
+        )
+        for element in rows:
+            if (element.code, element.value) in wanted:
+                elements[(element.code, element.value)] = element
+    return elements
+
+
+def share_version_elements(version):
+    """
+    Переводит элементы версии в общее хранилище.
+    """
+    if version.shared_storage:
+        return
+
+    using = version.elements_db
+    with transaction.atomic(using=using):
+        pairs = list(version.elements.values_list('code', 'value'))
+        # Удаление записывается в журнал раньше создания: элемент в журнале определяется
+        # парой (version_id, code), и реплика не должна удалить только что созданный элемент
+        version.elements.all().delete()
+        elements = get_shared_elements(pairs, using)
+
+        memberships = RefBookVersionElement.objects.using(using).bulk_create(
+            [RefBookVersionElement(version=version, element=elements[pair]) for pair in pairs],
+            batch_size=BATCH_SIZE,
+        )
+        record_changes(memberships, RefBookChange.ACTION_CREATE, using=using)
+
+        version.shared_storage = True
+        version.save(update_fields=['shared_storage'])
+
+
+def unshare_version_elements(version):
+    """
+    Возвращает элементы версии из общего хранилища в собственную таблицу версии.
+    """
+    if not version.shared_storage:
+        return
+
+    using = version.elements_db
+    with transaction.atomic(using=using):
+        pairs = list(version.get_elements().values_list('code', 'value'))
+        version.shared_memberships.all().delete()
+
+        elements = RefBookElement.objects.using(using).bulk_create(
+            [RefBookElement(version=version, code=code, value=value) for code, value in pairs],
+            batch_size=BATCH_SIZE,
+        )
+        record_changes(elements, RefBookChange.ACTION_CREATE, using=using)
+
+        version.shared_storage = False
+        version.save(update_fields=['shared_storage'])
+
+
+def delete_orphan_shared_elements(using='default'):
+    """
+    Удаляет элементы общего хранилища, на которые не ссылается ни одна версия.
+    Возвращает количество удаленных записей.
+    """
+    deleted, _ = SharedRefBookElement.objects.using(using).filter(
+        memberships__isnull=True
+    ).delete()
+    return deleted
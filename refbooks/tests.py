@@ -1,10 +1,26 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import date
+from unittest import skipIf, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.utils import timezone
 
-from .models import RefBook, RefBookVersion, RefBookElement
+from . import jobs
+from .models import RefBook, RefBookVersion, RefBookElement, SharedRefBookElement, RefBookChange, RefBookJob
+from .client import RefBookClient
+from .renderers import msgpack
+from .storage import share_version_elements, unshare_version_elements, delete_orphan_shared_elements
 
 
 class RefBookAPITestCase(TestCase):
@@ -133,3 +149,604 @@ class RefBookAPITestCase(TestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertFalse(response.data['result'])
+
+    def test_shared_storage_endpoints(self):
+        """
+        Эндпоинты работают одинаково после перевода версий в общее хранилище
+        """
+        for version in RefBookVersion.objects.all():
+            share_version_elements(version)
+
+        self.assertEqual(RefBookElement.objects.count(), 0)
+
+        url = reverse('refbooks-elements', args=[self.refbook1.id])
+        response = self.client.get(url, {'version': '1.0'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['elements']), 2)
+
+        url = reverse('refbooks-check-element', args=[self.refbook1.id])
+        response = self.client.get(url, {'code': '3', 'value': 'Хирург', 'version': '2.0'})
+        self.assertTrue(response.data['result'])
+        response = self.client.get(url, {'code': '3', 'value': 'Хирург', 'version': '1.0'})
+        self.assertFalse(response.data['result'])
+
+    def test_shared_storage_deduplicates(self):
+        """
+        Одинаковые пары (код, значение) хранятся в общем хранилище один раз
+        """
+        version1_3 = RefBookVersion.objects.create(
+            refbook=self.refbook1,
+            version="3.0",
+            date=timezone.datetime(2023, 1, 1).date()
+        )
+        RefBookElement.objects.create(version=version1_3, code="1", value="Врач-терапевт")
+        RefBookElement.objects.create(version=version1_3, code="2", value="Травматолог")
+
+        share_version_elements(self.version1_2)
+        share_version_elements(version1_3)
+
+        self.assertEqual(SharedRefBookElement.objects.count(), 3)
+        self.assertEqual(version1_3.get_elements().count(), 2)
+
+        unshare_version_elements(self.version1_2)
+        self.assertEqual(self.version1_2.get_elements().count(), 3)
+        self.assertEqual(delete_orphan_shared_elements(), 1)
+
+    def test_get_refbooks_search_and_fields(self):
+        """
+        Поиск справочников по началу кода или наименования и выбор полей
+        """
+        url = reverse('refbooks-list')
+
+        response = self.client.get(url, {'search': 'мкб'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['code'] for item in response.data['refbooks']], ['ICD-10'])
+
+        response = self.client.get(url, {'search': 'специальности'})
+        self.assertEqual([item['code'] for item in response.data['refbooks']], ['MS1'])
+
+        response = self.client.get(url, {'search': 'MS', 'fields': 'code'})
+        self.assertEqual(response.data['refbooks'], [{'code': 'MS1'}])
+
+        response = self.client.get(url, {'fields': 'code,description'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_refbooks_pagination(self):
+        """
+        Курсорная пагинация и закэшированное общее количество
+        """
+        url = reverse('refbooks-list')
+
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['refbooks']), 1)
+        self.assertEqual(response.data['count'], 2)
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['refbooks'][0]['code'], 'ICD-10')
+        self.assertIsNone(response.data['next'])
+
+        RefBook.objects.create(code="NEW", name="Новый справочник")
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_check_element_normalized(self):
+        """
+        Проверка элемента без учета регистра, ё/е и лишних пробелов
+        """
+        RefBookElement.objects.create(version=self.version1_2, code="4", value="Врач-ёмкостник")
+        url = reverse('refbooks-check-element', args=[self.refbook1.id])
+
+        response = self.client.get(url, {'code': '4', 'value': '  ВРАЧ-емкостник '})
+        self.assertFalse(response.data['result'])
+
+        response = self.client.get(url, {'code': '4', 'value': '  ВРАЧ-емкостник ', 'normalized': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['result'])
+
+        share_version_elements(self.version1_2)
+        response = self.client.get(url, {'code': '4', 'value': 'врач-Ёмкостник', 'normalized': '1'})
+        self.assertTrue(response.data['result'])
+
+    def test_columnar_format(self):
+        """
+        Колоночный JSON для элементов и списка справочников
+        """
+        url = reverse('refbooks-elements', args=[self.refbook1.id])
+        response = self.client.get(url, {'version': '1.0', 'format': 'columnar'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            {'codes': ['1', '2'], 'values': ['Медсестра', 'Фельдшер']}
+        )
+
+        url = reverse('refbooks-list')
+        response = self.client.get(
+            url, {'date': '2000-01-01', 'fields': 'id,code'},
+            HTTP_ACCEPT='application/vnd.refbooks.columnar+json'
+        )
+        self.assertEqual(json.loads(response.content), {'ids': [], 'codes': []})
+
+        # Остальные эндпоинты колоночный формат не поддерживают
+        response = self.client.get(reverse('refbooks-changes'), {'format': 'columnar'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @skipIf(msgpack is None, "msgpack не установлен")
+    def test_msgpack_format(self):
+        """
+        Ответ в формате MessagePack
+        """
+        url = reverse('refbooks-elements', args=[self.refbook1.id])
+        response = self.client.get(url, {'version': '1.0'}, HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+        self.assertEqual(
+            msgpack.unpackb(response.content),
+            {'elements': [{'code': '1', 'value': 'Медсестра'}, {'code': '2', 'value': 'Фельдшер'}]}
+        )
+
+    def test_changes_feed(self):
+        """
+        Журнал изменений с порядковыми номерами и постраничной выдачей
+        """
+        url = reverse('refbooks-changes')
+
+        response = self.client.get(url, {'limit': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['changes']), 3)
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(response.data['changes'][0]['object_type'], RefBookChange.OBJECT_REFBOOK)
+
+        response = self.client.get(url, {'since': response.data['last_seq']})
+        self.assertFalse(response.data['has_more'])
+        last_seq = response.data['last_seq']
+
+        element = RefBookElement.objects.get(version=self.version2_1, code="J00")
+        element.value = "Острый назофарингит"
+        element.save()
+        element.delete()
+
+        response = self.client.get(url, {'since': last_seq, 'refbook': self.refbook2.id})
+        self.assertEqual(
+            [(change['action'], change['data'].get('value')) for change in response.data['changes']],
+            [('update', 'Острый назофарингит'), ('delete', None)]
+        )
+        self.assertEqual(response.data['changes'][0]['version_id'], self.version2_1.id)
+
+        response = self.client.get(url, {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_changes_feed_bulk_delete(self):
+        """
+        Массовое удаление элементов записывается в журнал пакетно, без загрузки строк по одной
+        """
+        version = RefBookVersion.objects.create(
+            refbook=self.refbook1,
+            version="3.0",
+            date=timezone.datetime(2023, 1, 1).date()
+        )
+        RefBookElement.objects.bulk_create(
+            [RefBookElement(version=version, code=str(code), value="Значение") for code in range(1000)]
+        )
+        last_seq = RefBookChange.objects.latest('seq').seq
+
+        with CaptureQueriesContext(connection) as queries:
+            version.elements.all().delete()
+        deletes = [query for query in queries.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 1)
+        self.assertLess(len(queries), 20)
+
+        changes = RefBookChange.objects.filter(seq__gt=last_seq)
+        self.assertEqual(changes.filter(action=RefBookChange.ACTION_DELETE).count(), 1000)
+        self.assertFalse(version.elements.exists())
+
+    def test_profiling(self):
+        """
+        Профилирование запроса по заголовку и сводка по сохраненным профилям
+        """
+        with tempfile.TemporaryDirectory() as profile_dir, override_settings(
+            REFBOOKS_PROFILING_ENABLED=True, REFBOOKS_PROFILING_DIR=profile_dir,
+            REFBOOKS_PROFILING_SECRET='secret', REFBOOKS_PROFILING_MAX_PROFILES=2
+        ):
+            client = APIClient()
+            url = reverse('refbooks-elements', args=[self.refbook1.id])
+
+            response = client.get(url)
+            self.assertNotIn('X-Profile-Id', response)
+            # Заголовок без секрета не включает профилирование
+            response = client.get(url, HTTP_X_PROFILE='1')
+            self.assertNotIn('X-Profile-Id', response)
+
+            for _ in range(3):
+                response = client.get(url, HTTP_X_PROFILE='secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(os.path.exists(os.path.join(profile_dir, response['X-Profile-Id'])))
+            self.assertEqual(len(os.listdir(profile_dir)), 2)
+
+            output = io.StringIO()
+            call_command('refbook_profiles', stdout=output)
+            self.assertIn(response['X-Profile-Id'], output.getvalue())
+            self.assertIn('refbooks/views.py', output.getvalue())
+
+    def test_validate_document(self):
+        """
+        Проверка всех кодированных полей документа за один вызов
+        """
+        url = reverse('refbooks-validate-document')
+        document = {
+            'doctor': {'specialty': {'code': '3', 'value': 'хирург'}},
+            'diagnoses': [
+                {'code': 'J00', 'value': 'Острый насморк'},
+                {'code': 'J99', 'value': 'Неизвестно'},
+            ],
+            'main_diagnosis': 'S99',
+        }
+        fields = {
+            'doctor.specialty': 'MS1',
+            'diagnoses.*': 'ICD-10',
+            'main_diagnosis': 'ICD-10',
+            'extra': 'UNKNOWN',
+        }
+
+        with self.assertNumQueries(4):
+            response = self.client.post(url, {'document': document, 'fields': fields}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['valid'])
+        self.assertEqual(response.data['checked'], 4)
+        self.assertEqual(
+            [(error['field'], error['error']) for error in response.data['errors']],
+            [
+                ('diagnoses.1', 'Код отсутствует в справочнике'),
+                ('doctor.specialty', 'Значение не совпадает со значением в справочнике'),
+                ('extra', 'Поле отсутствует в документе'),
+            ]
+        )
+
+        del fields['extra']
+        document['diagnoses'].pop()
+        response = self.client.post(url, {'document': document, 'fields': fields, 'normalized': True}, format='json')
+        self.assertTrue(response.data['valid'])
+
+        response = self.client.post(
+            url, {'document': document, 'fields': fields, 'date': '2022-03-01'}, format='json'
+        )
+        self.assertEqual(response.data['errors'][0]['error'], 'Код отсутствует в справочнике')
+
+        response = self.client.post(url, {'document': document}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_code_history(self):
+        """
+        История кода по версиям справочника одним запросом
+        """
+        version1_3 = RefBookVersion.objects.create(
+            refbook=self.refbook1,
+            version="3.0",
+            date=timezone.datetime(2023, 1, 1).date()
+        )
+        RefBookElement.objects.create(version=version1_3, code="3", value="Хирург")
+        share_version_elements(version1_3)
+
+        url = reverse('refbooks-code-history', args=[self.refbook1.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'code': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['history'], [
+            {'version': '1.0', 'date_from': date(2022, 1, 1), 'date_to': date(2022, 5, 31), 'value': 'Медсестра'},
+            {'version': '2.0', 'date_from': date(2022, 6, 1), 'date_to': date(2022, 12, 31), 'value': 'Врач-терапевт'},
+        ])
+
+        response = self.client.get(url, {'code': '3'})
+        self.assertEqual(
+            [(item['version'], item['date_to']) for item in response.data['history']],
+            [('2.0', date(2022, 12, 31)), ('3.0', None)]
+        )
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REFBOOKS_JOBS_EAGER=True)
+    def test_import_version_job(self):
+        """
+        Загрузка версии выполняется фоновой задачей, статус которой доступен по /jobs/<id>
+        """
+        url = reverse('refbooks-import', args=[self.refbook1.id])
+        payload = {
+            'version': '3.0',
+            'date': '2023-01-01',
+            'elements': [{'code': str(code), 'value': f"Специальность {code}"} for code in range(1, 1201)],
+        }
+        response = self.client.post(url, payload, format='json')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        self.assertFalse(RefBookJob.objects.exists())
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        response = self.client.get(reverse('refbooks-job', args=[response.data['id']]))
+        self.assertEqual(response.data['status'], RefBookJob.STATUS_DONE, response.data['error'])
+        self.assertEqual((response.data['processed'], response.data['progress']), (1200, 100))
+
+        version = self.refbook1.versions.get(version='3.0')
+        self.assertEqual(version.elements.count(), 1200)
+        self.assertTrue(version.is_ready)
+        self.assertEqual(RefBookChange.objects.filter(version_id=version.pk).count(), 1202)
+        self.assertEqual(RefBookChange.objects.filter(version_id=version.pk).latest('seq').data['is_ready'], True)
+        self.assertNotIn('elements', RefBookJob.objects.get(pk=response.data['id']).payload)
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        payload.update(version='4.0', date='2024-01-01', elements=[{'code': '1', 'value': 'А'}] * 2)
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_version_not_ready(self):
+        """
+        Версия, загрузка которой не завершена, не выбирается как текущая и по номеру
+        """
+        version = RefBookVersion.objects.create(
+            refbook=self.refbook1,
+            version="3.0",
+            date=timezone.datetime(2023, 1, 1).date(),
+            is_ready=False
+        )
+        RefBookElement.objects.create(version=version, code="4", value="Педиатр")
+
+        url = reverse('refbooks-elements', args=[self.refbook1.id])
+        self.assertEqual(len(self.client.get(url).data['elements']), 3)
+        self.assertEqual(self.client.get(url, {'version': '3.0'}).status_code, status.HTTP_404_NOT_FOUND)
+
+        url = reverse('refbooks-code-history', args=[self.refbook1.id])
+        response = self.client.get(url, {'code': '3'})
+        self.assertEqual(response.data['history'][0]['date_to'], None)
+        self.assertEqual(self.client.get(url, {'code': '4'}).data['history'], [])
+
+    @skipUnless(settings.API_DOCS_ENABLED, "документация API отключена")
+    def test_openapi_schema(self):
+        """
+        Схема OpenAPI строится для всех эндпоинтов
+        """
+        response = self.client.get(reverse('schema-json', args=['.json']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        paths = json.loads(response.content)['paths']
+        self.assertIn('/refbooks/validate_document', paths)
+        self.assertIn('/changes', paths)
+
+
+@skipUnless(settings.REFBOOKS_SHARDS, "шарды не настроены, запустите тесты с REFBOOKS_SHARDS=test")
+class RefBookShardTestCase(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.shard = settings.REFBOOKS_SHARDS[0]
+        self.refbook = RefBook.objects.create(code="ICD-10", name="МКБ-10")
+        self.version = RefBookVersion.objects.create(
+            refbook=self.refbook,
+            version="1.0",
+            date=timezone.datetime(2022, 1, 1).date()
+        )
+        RefBookElement.objects.create(version=self.version, code="J00", value="Острый насморк")
+
+    def test_move_refbook_to_shard(self):
+        """
+        Элементы справочника переносятся в шард, эндпоинты продолжают работать
+        """
+        last_seq = RefBookChange.objects.latest('seq').seq
+        call_command('move_refbook_shard', 'ICD-10', self.shard, stdout=io.StringIO())
+        self.refbook.refresh_from_db()
+        self.assertEqual(self.refbook.db_alias, self.shard)
+        # Перенос не меняет содержимого справочника и не попадает в журнал как изменение элементов
+        self.assertFalse(
+            RefBookChange.objects.filter(seq__gt=last_seq, object_type=RefBookChange.OBJECT_ELEMENT).exists()
+        )
+        self.assertFalse(RefBookElement.objects.using('default').exists())
+        self.assertEqual(RefBookElement.objects.using(self.shard).count(), 1)
+
+        url = reverse('refbooks-check-element', args=[self.refbook.id])
+        response = self.client.get(url, {'code': 'J00', 'value': 'Острый насморк'})
+        self.assertTrue(response.data['result'])
+
+        # Элемент, у которого задан только version_id, сохраняется в шард справочника
+        RefBookElement(version_id=self.version.pk, code="J02", value="Острый фарингит").save()
+        self.assertEqual(self.version.get_elements().count(), 2)
+        RefBookElement.objects.using(self.shard).get(code="J02").delete()
+
+        # Изменения элементов шарда записываются в журнал шарда и попадают в общий журнал при его чтении
+        last_seq = RefBookChange.objects.latest('seq').seq
+        self.assertEqual(RefBookChange.objects.using(self.shard).count(), 2)
+        response = self.client.get(reverse('refbooks-changes'), {'since': last_seq})
+        self.assertEqual(
+            [
+                (change['action'], change['data']['version_id'], change['data']['code'])
+                for change in response.data['changes']
+            ],
+            [('create', self.version.pk, 'J02'), ('delete', self.version.pk, 'J02')]
+        )
+
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        response = self.client.get(reverse('admin:refbooks_refbookelement_changelist'), {'db': self.shard})
+        self.assertContains(response, 'Острый насморк')
+        element = RefBookElement.objects.using(self.shard).get(code="J00")
+        response = self.client.get(
+            reverse('admin:refbooks_refbookelement_change', args=[element.pk]),
+            {'_changelist_filters': f'db={self.shard}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        version = RefBookVersion.objects.create(
+            refbook=self.refbook,
+            version="2.0",
+            date=timezone.datetime(2023, 1, 1).date()
+        )
+        RefBookElement.objects.create(version=version, code="J01", value="Острый синусит")
+        self.assertEqual(version.get_elements().count(), 1)
+        self.assertFalse(RefBookElement.objects.using('default').exists())
+
+        version.delete()
+        self.assertEqual(RefBookElement.objects.using(self.shard).count(), 1)
+
+        call_command('move_refbook_shard', 'ICD-10', 'default', stdout=io.StringIO())
+        self.assertEqual(RefBookElement.objects.using('default').count(), 1)
+        self.assertFalse(RefBook.objects.using(self.shard).exists())
+
+
+@override_settings(REFBOOKS_JOBS_EAGER=False, REFBOOKS_JOB_WORKERS=1)
+class RefBookJobQueueTestCase(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        jobs._executor = None
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        self.refbook = RefBook.objects.create(code="MS1", name="Специальности медработников")
+
+    def tearDown(self):
+        if jobs._executor is not None:
+            jobs._executor.shutdown(wait=True)
+        jobs._executor = None
+
+    def test_jobs_run_in_worker_thread(self):
+        """
+        Задача ставится в очередь после фиксации транзакции и выполняется в потоке пула,
+        задачи, процесс которых остановился, выполняются заново, задачи работающих процессов не трогаются,
+        ошибка возвращается без трассировки
+        """
+        expired = timezone.now() - timezone.timedelta(seconds=settings.REFBOOKS_JOB_LEASE_TIMEOUT + 1)
+        interrupted = RefBookJob.objects.create(
+            kind=RefBookJob.KIND_IMPORT_VERSION,
+            status=RefBookJob.STATUS_RUNNING,
+            worker='stopped:1',
+            heartbeat_at=expired,
+            refbook=self.refbook,
+            payload={
+                'refbook_id': self.refbook.pk,
+                'version': '1.0',
+                'date': '2022-01-01',
+                'elements': [{'code': '1', 'value': 'Медсестра'}],
+            }
+        )
+        # Версия, частично загруженная прерванной задачей
+        RefBookVersion.objects.create(
+            refbook=self.refbook, version='1.0', date=timezone.datetime(2022, 1, 1).date(), is_ready=False
+        )
+        # Задача, которую выполняет другой работающий процесс
+        live = RefBookJob.objects.create(
+            kind=RefBookJob.KIND_IMPORT_VERSION,
+            status=RefBookJob.STATUS_RUNNING,
+            worker='alive:2',
+            heartbeat_at=timezone.now(),
+            refbook=self.refbook,
+            payload={'refbook_id': self.refbook.pk, 'version': '3.0', 'date': '2024-01-01', 'elements': []}
+        )
+        RefBookVersion.objects.create(
+            refbook=self.refbook, version='3.0', date=timezone.datetime(2024, 1, 1).date(), is_ready=False
+        )
+        failing = RefBookJob.objects.create(
+            kind=RefBookJob.KIND_IMPORT_VERSION,
+            payload={'refbook_id': self.refbook.pk + 1, 'version': '1.0', 'date': '2022-01-01', 'elements': []}
+        )
+
+        # Запрос статуса не запускает пул и не восстанавливает задачи
+        self.client.get(reverse('refbooks-job', args=[interrupted.pk]))
+        self.assertIsNone(jobs._executor)
+
+        url = reverse('refbooks-import', args=[self.refbook.id])
+        with self.assertLogs('refbooks.jobs', 'WARNING') as logs:
+            with transaction.atomic():
+                response = self.client.post(url, {
+                    'version': '2.0',
+                    'date': '2023-01-01',
+                    'elements': [{'code': '1', 'value': 'Врач-терапевт'}, {'code': '2', 'value': 'Хирург'}],
+                }, format='json')
+                self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+                self.assertIsNone(jobs._executor)
+            jobs._executor.shutdown(wait=True)
+
+        response = self.client.get(reverse('refbooks-job', args=[response.data['id']]))
+        self.assertEqual((response.data['status'], response.data['processed']), (RefBookJob.STATUS_DONE, 2))
+        interrupted.refresh_from_db()
+        self.assertEqual(interrupted.status, RefBookJob.STATUS_DONE)
+        live.refresh_from_db()
+        self.assertEqual((live.status, live.worker), (RefBookJob.STATUS_RUNNING, 'alive:2'))
+        self.assertEqual(
+            list(self.refbook.versions.order_by('version').values_list('version', 'is_ready')),
+            [('1.0', True), ('2.0', True), ('3.0', False)]
+        )
+
+        response = self.client.get(reverse('refbooks-job', args=[failing.pk]))
+        self.assertEqual(response.data['status'], RefBookJob.STATUS_FAILED)
+        self.assertNotIn('Traceback', response.data['error'])
+        self.assertTrue(any('Traceback' in message for message in logs.output))
+
+
+class RefBookClientTestCase(LiveServerTestCase):
+    def setUp(self):
+        self.refbook = RefBook.objects.create(code="MS1", name="Специальности медработников")
+        self.version = RefBookVersion.objects.create(
+            refbook=self.refbook,
+            version="1.0",
+            date=timezone.datetime(2022, 1, 1).date()
+        )
+        RefBookElement.objects.create(version=self.version, code="1", value="Медсестра")
+        RefBookElement.objects.create(version=self.version, code="2", value="Фельдшер")
+
+        self.client = RefBookClient(f"{self.live_server_url}/api/", ttl=60)
+        self.addCleanup(self.client.close)
+
+        self.requests = []
+        request = self.client.pool.request
+
+        def counting_request(method, path, headers=None):
+            result = request(method, path, headers)
+            self.requests.append(result[0])
+            return result
+
+        self.client.pool.request = counting_request
+
+    def test_check_element_uses_local_copy(self):
+        """
+        Проверка элементов по локальной копии версии без повторных запросов
+        """
+        self.assertTrue(self.client.check_element(self.refbook.id, "1", "Медсестра"))
+        self.assertTrue(self.client.check_element(self.refbook.id, "2", " фельдшер", normalized=True))
+        self.assertFalse(self.client.check_element(self.refbook.id, "2", "Медсестра"))
+        self.assertEqual(self.client.get_value(self.refbook.id, "2"), "Фельдшер")
+        self.assertEqual(self.requests, [200])
+
+    def test_revalidation_with_etag(self):
+        """
+        Устаревшая копия перепроверяется по ETag
+        """
+        self.client.ttl = 0
+        self.assertEqual(self.client.get_elements(self.refbook.id, "1.0"), {"1": "Медсестра", "2": "Фельдшер"})
+        self.client.get_elements(self.refbook.id, "1.0")
+        self.assertEqual(self.requests, [200, 304])
+
+        RefBookElement.objects.create(version=self.version, code="3", value="Хирург")
+        self.assertEqual(self.client.get_value(self.refbook.id, "3", "1.0"), "Хирург")
+        self.assertEqual(self.requests, [200, 304, 200])
+
+    def test_invalidate_disk_cache(self):
+        """
+        Сброс кэша удаляет и записи, которые есть только на диске
+        """
+        other = RefBook.objects.create(code="ICD-10", name="МКБ-10")
+        version = RefBookVersion.objects.create(refbook=other, version="1.0", date=timezone.datetime(2022, 1, 1).date())
+        RefBookElement.objects.create(version=version, code="J00", value="Острый насморк")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with RefBookClient(f"{self.live_server_url}/api/", ttl=60, cache_dir=cache_dir) as client:
+                client.get_elements(self.refbook.id)
+                client.get_elements(other.id)
+
+            # Новый клиент (например, после перезапуска) знает о записях только по файлам на диске
+            with RefBookClient(f"{self.live_server_url}/api/", ttl=60, cache_dir=cache_dir) as client:
+                client.invalidate(self.refbook.id)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                self.assertEqual(client.get_elements(other.id), {"J00": "Острый насморк"})
+                client.invalidate()
+                self.assertEqual(os.listdir(cache_dir), [])
@@ -1,8 +1,16 @@
 from django.urls import path
-from refbooks.views import RefBookListAPIView, RefBookElementsAPIView, RefBookElementCheckAPIView
+from refbooks.views import (
+    RefBookListAPIView, RefBookElementsAPIView, RefBookElementCheckAPIView, RefBookCodeHistoryAPIView,
+    RefBookChangesAPIView, DocumentValidationAPIView, RefBookVersionImportAPIView, RefBookJobAPIView
+)
 
 urlpatterns = [
     path('refbooks/', RefBookListAPIView.as_view(), name='refbooks-list'),
     path('refbooks/<int:id>/elements', RefBookElementsAPIView.as_view(), name='refbooks-elements'),
     path('refbooks/<int:id>/check_element', RefBookElementCheckAPIView.as_view(), name='refbooks-check-element'),
+    path('refbooks/<int:id>/code_history', RefBookCodeHistoryAPIView.as_view(), name='refbooks-code-history'),
+    path('refbooks/validate_document', DocumentValidationAPIView.as_view(), name='refbooks-validate-document'),
+    path('refbooks/<int:id>/import', RefBookVersionImportAPIView.as_view(), name='refbooks-import'),
+    path('jobs/<int:id>', RefBookJobAPIView.as_view(), name='refbooks-job'),
+    path('changes', RefBookChangesAPIView.as_view(), name='refbooks-changes'),
 ]
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Проверка кодированных полей документа по нескольким справочникам.
+
+Значения извлекаются из документа по путям, группируются по справочникам, версия каждого справочника
+определяется один раз, а элементы группы проверяются одним запросом с code__in.
+Стоимость проверки документа - несколько запросов независимо от количества полей.
+"""
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from refbooks.models import RefBook, RefBookVersion
+from refbooks.normalization import normalize_value
+
+# Ограничение SQLite на количество параметров запроса
+CODES_BATCH_SIZE = 500
+WILDCARD = '*'
+
+
+class CodedValue:
+    """
+    Кодированное значение, извлеченное из документа.
+    """
+
+    def __init__(self, path, refbook_code, code, value=None):
+        self.path = path
+        self.refbook_code = refbook_code
+        self.code = code
+        self.value = value
+
+
+def _error(item, message, **extra):
+    return {'field': item.path, 'refbook': item.refbook_code, 'code': item.code, 'error': message, **extra}
+
+
+def resolve_path(document, path):
+    """
+    Возвращает список пар (конкретный путь, значение) для пути вида a.b.0.c или a.*.c,
+    где * - каждый элемент списка. Отсутствующие ключи возвращаются со значением None.
+    """
+    results = [('', document)]
+    for part in path.split('.'):
+        next_results = []
+        for prefix, node in results:
+            if part == WILDCARD and isinstance(node, list):
+                next_results.extend((f"{prefix}.{index}".lstrip('.'), item) for index, item in enumerate(node))
+                continue
+
+            concrete = f"{prefix}.{part}".lstrip('.')
+            if isinstance(node, dict):
+                next_results.append((concrete, node.get(part)))
+            elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                next_results.append((concrete, node[int(part)]))
+            else:
+                next_results.append((concrete, None))
+        results = next_results
+    return results
+
+
+def extract_coded_values(document, fields):
+    """
+    Извлекает кодированные значения документа.
+    Значение поля - строка с кодом или объект {"code": ..., "value": ...}.
+    Возвращает (список CodedValue, список ошибок извлечения).
+    """
+    items = []
+    errors = []
+    for path, refbook_code in fields.items():
+        for concrete_path, raw in resolve_path(document, path):
+            if isinstance(raw, dict):
+                code, value = raw.get('code'), raw.get('value')
+            else:
+                code, value = raw, None
+
+            item = CodedValue(concrete_path, refbook_code, code, value)
+            if code is None:
+                errors.append(_error(item, "Поле отсутствует в документе"))
+            elif not isinstance(code, str) or (value is not None and not isinstance(value, str)):
+                errors.append(_error(item, "Код и значение должны быть строками"))
+            else:
+                items.append(item)
+    return items, errors
+
+
+def get_versions(refbook_codes, date):
+    """
+    Версии справочников, действующие на дату: {код справочника: версия}.
+    """
+    current_version = RefBookVersion.objects.filter(
+        refbook=OuterRef('pk'),
+        date__lte=date,
+        is_ready=True
+    ).order_by('-date').values('pk')[:1]
+
+    refbooks = list(
+        RefBook.objects.filter(code__in=refbook_codes).annotate(version_id=Subquery(current_version))
+    )
+    versions = RefBookVersion.objects.in_bulk(
+        [refbook.version_id for refbook in refbooks if refbook.version_id is not None]
+    )
+
+    result = {}
+    for refbook in refbooks:
+        version = versions.get(refbook.version_id)
+        if version is not None:
+            version.refbook = refbook
+        result[refbook.code] = version
+    return result
+
+
+def validate_document(document, fields, date=None, normalized=False):
+    """
+    Проверяет кодированные поля документа.
+
+    fields - словарь {путь к полю: код справочника}, date - дата, на которую выбираются версии
+    справочников (по умолчанию текущая), normalized - сравнивать значения без учета регистра, ё/е и пробелов.
+    Возвращает словарь с признаком valid, количеством проверенных значений и списком ошибок по полям.
+    """
+    date = date or timezone.now().date()
+    items, errors = extract_coded_values(document, fields)
+
+    groups = {}
+    for item in items:
+        groups.setdefault(item.refbook_code, []).append(item)
+
+    versions = get_versions(list(groups), date)
+
+    for refbook_code, group in groups.items():
+        if refbook_code not in versions:
+            errors.extend(_error(item, "Справочник не найден") for item in group)
+            continue
+
+        version = versions[refbook_code]
+        if version is None:
+            errors.extend(_error(item, "У справочника нет активной версии") for item in group)
+            continue
+
+        codes = sorted({item.code for item in group})
+        elements = {}
+        for start in range(0, len(codes), CODES_BATCH_SIZE):
+            rows = version.get_elements().filter(
+                code__in=codes[start:start + CODES_BATCH_SIZE]
+            ).values_list('code', 'value', 'normalized_value')
+            elements.update((code, (value, normalized_value)) for code, value, normalized_value in rows)
+
+        for item in group:
+            if item.code not in elements:
+                errors.append(_error(item, "Код отсутствует в справочнике", version=version.version))
+                continue
+            if item.value is None:
+                continue
+
+            value, normalized_value = elements[item.code]
+            matches = (
+                normalize_value(item.value) == normalized_value if normalized else item.value == value
+            )
+            if not matches:
+                errors.append(_error(
+                    item, "Значение не совпадает со значением в справочнике",
+                    version=version.version, expected=value
+                ))
+
+    errors.sort(key=lambda error: error['field'])
+    return {'valid': not errors, 'checked': len(items), 'errors': errors}
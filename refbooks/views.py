@@ -1,15 +1,32 @@
+import hashlib
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
 from rest_framework import status
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, Max, OuterRef, Q
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
 # Create your views here.
 
 
-from refbooks.models import RefBook, RefBookVersion, RefBookElement
-from refbooks.serializers import RefBookSerializer, RefBookElementSerializer
+from refbooks.changes import collect_shard_changes
+from refbooks.docs import openapi, swagger_auto_schema
+from refbooks.history import get_code_history
+from refbooks.jobs import submit_job
+from refbooks.models import RefBook, RefBookVersion, RefBookChange, RefBookJob
+from refbooks.normalization import normalize_value
+from refbooks.pagination import RefBookCursorPagination
+from refbooks.renderers import ColumnarJSONRenderer
+from refbooks.serializers import (
+    RefBookSerializer, RefBookElementSerializer, RefBookChangeSerializer, DocumentValidationSerializer,
+    RefBookJobSerializer, VersionImportSerializer
+)
+from refbooks.signals import get_refbooks_generation
+from refbooks.validation import validate_document
 
 
 class RefBookListAPIView(APIView):
@@ -22,9 +39,16 @@ class RefBookListAPIView(APIView):
 
     Параметры запроса:
       - date (string, формат: ГГГГ-ММ-ДД, опционально): Если передан, фильтрует справочники по наличию активной версии на указанную дату
+      - search (string, опционально): поиск по началу кода или наименования справочника без учета регистра и ё/е
+      - fields (string, опционально): список возвращаемых полей через запятую (id, code, name)
+      - cursor, page_size (опционально): курсорная пагинация. Если передан любой из параметров,
+        в ответ добавляются ссылки next/previous и общее количество count
 
-    В случае неверного формата даты возвращается HTTP 400 с сообщением об ошибке.
+    В случае неверного формата даты или неизвестного поля возвращается HTTP 400 с сообщением об ошибке.
     """
+    pagination_class = RefBookCursorPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+    columnar_fields = RefBookSerializer.Meta.fields
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -34,6 +58,30 @@ class RefBookListAPIView(APIView):
                 description="Дата начала действия в формате ГГГГ-ММ-ДД",
                 type=openapi.TYPE_STRING,
                 format=openapi.FORMAT_DATE
+            ),
+            openapi.Parameter(
+                'search',
+                openapi.IN_QUERY,
+                description="Начало кода или наименования справочника",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Возвращаемые поля через запятую: id, code, name",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Курсор страницы из ссылок next/previous",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Размер страницы",
+                type=openapi.TYPE_INTEGER
             )
         ],
         responses={
@@ -50,34 +98,85 @@ class RefBookListAPIView(APIView):
                                 'name': openapi.Schema(type=openapi.TYPE_STRING),
                             }
                         )
-                    )
+                    ),
+                    'next': openapi.Schema(type=openapi.TYPE_STRING),
+                    'previous': openapi.Schema(type=openapi.TYPE_STRING),
+                    'count': openapi.Schema(type=openapi.TYPE_INTEGER),
                 }
-            ))
+            )),
+            400: openapi.Response('Неверный параметр запроса')
         }
     )
     def get(self, request):
         date_param = request.query_params.get('date')
+        search_param = request.query_params.get('search')
+        fields_param = request.query_params.get('fields')
 
-        queryset = RefBook.objects.all()
+        queryset = RefBook.objects.order_by('id')
 
         if date_param:
             try:
                 specified_date = timezone.datetime.strptime(date_param, '%Y-%m-%d').date()
-                # Фильтруем справочники, у которых есть версии с датой начала <= указанной даты
-                refbooks_ids = RefBookVersion.objects.filter(
-                    date__lte=specified_date
-                ).values_list('refbook_id', flat=True).distinct()
-
-                queryset = queryset.filter(id__in=refbooks_ids)
             except ValueError:
                 return Response(
                     {"error": "Неверный формат даты. Используйте ГГГГ-ММ-ДД"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            # Фильтруем справочники, у которых есть версии с датой начала <= указанной даты
+            queryset = queryset.filter(Exists(RefBookVersion.objects.filter(
+                refbook=OuterRef('pk'),
+                date__lte=specified_date,
+                is_ready=True
+            )))
+
+        prefix = normalize_value(search_param or '')
+        if prefix:
+            # Поиск по началу нормализованных кода и наименования диапазоном значений,
+            # чтобы SQLite использовал индексы (LIKE по ним не работает и учитывает регистр кириллицы)
+            queryset = queryset.filter(
+                Q(search_code__gte=prefix, search_code__lt=prefix + '\uffff')
+                | Q(search_name__gte=prefix, search_name__lt=prefix + '\uffff')
+            )
 
-        serializer = RefBookSerializer(queryset, many=True)
-
-        return Response({"refbooks": serializer.data})
+        fields = None
+        if fields_param:
+            fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+            unknown = set(fields) - set(RefBookSerializer.Meta.fields)
+            if unknown or not fields:
+                return Response(
+                    {"error": f"Допустимые поля: {', '.join(RefBookSerializer.Meta.fields)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.only(*fields)
+            self.columnar_fields = fields
+
+        paginator = self.pagination_class()
+        if not paginator.is_requested(request):
+            serializer = RefBookSerializer(queryset, many=True, fields=fields)
+            return Response({"refbooks": serializer.data})
+
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = RefBookSerializer(page, many=True, fields=fields)
+
+        return Response({
+            "refbooks": serializer.data,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "count": self.get_cached_count(queryset, date_param, search_param),
+        })
+
+    @staticmethod
+    def get_cached_count(queryset, date_param, search_param):
+        """
+        Общее количество справочников по фильтрам. Кэшируется до изменения справочников или версий.
+        """
+        key = 'refbooks:count:{}:{}'.format(
+            get_refbooks_generation(),
+            hashlib.md5(f"{date_param or ''}|{search_param or ''}".encode()).hexdigest()
+        )
+        return cache.get_or_set(
+            key, queryset.count, timeout=settings.REFBOOKS_COUNT_CACHE_TIMEOUT
+        )
 
 
 class RefBookElementsAPIView(APIView):
@@ -92,9 +191,13 @@ class RefBookElementsAPIView(APIView):
     Параметры запроса:
       - version (string, опционально): номер версии справочника, для которой необходимо получить элементы.
 
+    Ответ содержит заголовок ETag, который меняется при любом изменении версии или ее элементов.
+    Если клиент передал его в If-None-Match и данные не изменились, возвращается HTTP 304 без тела.
+
     Если справочник с указанным идентификатором не найден, возвращается HTTP 404.
     """
-
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+    columnar_fields = RefBookElementSerializer.Meta.fields
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -121,6 +224,7 @@ class RefBookElementsAPIView(APIView):
                     )
                 }
             )),
+            304: openapi.Response('Элементы не изменились'),
             404: openapi.Response('Справочник не найден')
         }
     )
@@ -130,13 +234,13 @@ class RefBookElementsAPIView(APIView):
 
         if version_param:
             # Получаем конкретную версию
-            version = get_object_or_404(RefBookVersion, refbook=refbook, version=version_param)
+            version = get_object_or_404(refbook.versions.filter(is_ready=True), version=version_param)
         else:
             # Получаем текущую версию
             current_date = timezone.now().date()
-            version = RefBookVersion.objects.filter(
-                refbook=refbook,
-                date__lte=current_date
+            version = refbook.versions.filter(
+                date__lte=current_date,
+                is_ready=True
             ).order_by('-date').first()
 
             if not version:
@@ -145,10 +249,30 @@ class RefBookElementsAPIView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-        elements = RefBookElement.objects.filter(version=version)
+        etag = self.get_etag(request, version)
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        elements = version.get_elements()
         serializer = RefBookElementSerializer(elements, many=True)
 
-        return Response({"elements": serializer.data})
+        return Response({"elements": serializer.data}, headers={'ETag': etag})
+
+    @staticmethod
+    def get_etag(request, version):
+        """
+        ETag версии: идентификатор версии, номер последнего изменения версии или ее элементов
+        в журнале (для шарда - также в журнале шарда) и формат ответа.
+        """
+        last_seq = RefBookChange.objects.filter(
+            version_id=version.pk
+        ).aggregate(last_seq=Max('seq'))['last_seq'] or 0
+        if version.elements_db != 'default':
+            shard_seq = RefBookChange.objects.using(version.elements_db).filter(
+                version_id=version.pk
+            ).aggregate(last_seq=Max('seq'))['last_seq'] or 0
+            last_seq = f'{last_seq}.{version.elements_db}:{shard_seq}'
+        return f'"{version.pk}.{last_seq}.{request.accepted_renderer.format}"'
 
 
 class RefBookElementCheckAPIView(APIView):
@@ -166,6 +290,7 @@ class RefBookElementCheckAPIView(APIView):
       - code (string, обязательный): код элемента справочника.
       - value (string, обязательный): значение элемента справочника.
       - version (string, опционально): номер версии справочника.
+      - normalized (boolean, опционально): сравнивать значение без учета регистра, ё/е и лишних пробелов.
 
     Если обязательные параметры отсутствуют, возвращается HTTP 400.
     Если справочник не найден — HTTP 404.
@@ -191,6 +316,12 @@ class RefBookElementCheckAPIView(APIView):
                 openapi.IN_QUERY,
                 description="Версия справочника",
                 type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'normalized',
+                openapi.IN_QUERY,
+                description="Сравнивать значение без учета регистра, ё/е и лишних пробелов",
+                type=openapi.TYPE_BOOLEAN
             )
         ],
         responses={
@@ -219,13 +350,13 @@ class RefBookElementCheckAPIView(APIView):
 
         if version_param:
             # Получаем конкретную версию
-            version = get_object_or_404(RefBookVersion, refbook=refbook, version=version_param)
+            version = get_object_or_404(refbook.versions.filter(is_ready=True), version=version_param)
         else:
             # Получаем текущую версию
             current_date = timezone.now().date()
-            version = RefBookVersion.objects.filter(
-                refbook=refbook,
-                date__lte=current_date
+            version = refbook.versions.filter(
+                date__lte=current_date,
+                is_ready=True
             ).order_by('-date').first()
 
             if not version:
@@ -235,10 +366,329 @@ class RefBookElementCheckAPIView(APIView):
                 )
 
         # Проверяем существование элемента
-        element_exists = RefBookElement.objects.filter(
-            version=version,
+        if request.query_params.get('normalized', '').lower() in ('1', 'true'):
+            element_filter = {'normalized_value': normalize_value(value)}
+        else:
+            element_filter = {'value': value}
+
+        element_exists = version.get_elements().filter(
             code=code,
-            value=value
+            **element_filter
         ).exists()
 
-        return Response({"result": element_exists})
\ No newline at end of file
+        return Response({"result": element_exists})
+
+
+class RefBookCodeHistoryAPIView(APIView):
+    """
+    История кода элемента справочника.
+
+    Описание:
+      Этот эндпоинт возвращает версии справочника, в которых есть элемент с указанным кодом,
+      в порядке дат начала действия. Для каждой версии указываются период действия и значение элемента.
+      Конец периода - день перед началом следующей версии справочника (null для последней версии).
+      Идентификатор справочника передается в URL.
+
+    Параметры запроса:
+      - code (string, обязательный): код элемента справочника.
+
+    Если параметр code отсутствует, возвращается HTTP 400.
+    Если справочник не найден — HTTP 404.
+    """
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'code',
+                openapi.IN_QUERY,
+                description="Код элемента",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={
+            200: openapi.Response('История кода', schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'code': openapi.Schema(type=openapi.TYPE_STRING),
+                    'history': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'version': openapi.Schema(type=openapi.TYPE_STRING),
+                                'date_from': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+                                'date_to': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+                                'value': openapi.Schema(type=openapi.TYPE_STRING),
+                            }
+                        )
+                    )
+                }
+            )),
+            400: openapi.Response('Отсутствует обязательный параметр'),
+            404: openapi.Response('Справочник не найден')
+        }
+    )
+    def get(self, request, id):
+        code = request.query_params.get('code')
+
+        if not code:
+            return Response(
+                {"error": "Параметр code обязателен"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        refbook = get_object_or_404(RefBook, id=id)
+
+        return Response({"code": code, "history": get_code_history(refbook, code)})
+
+
+class RefBookChangesAPIView(APIView):
+    """
+    Журнал изменений справочников.
+
+    Описание:
+      Этот эндпоинт возвращает изменения справочников, версий и элементов в порядке их порядковых номеров.
+      Реплика запоминает last_seq из ответа и при следующей синхронизации передает его в параметре `since`,
+      получая только то, что изменилось с прошлого раза.
+      Элемент определяется парой (version_id, code) в data: object_id элемента уникален только
+      в пределах БД, в которой хранятся элементы справочника.
+
+    Параметры запроса:
+      - since (integer, опционально): вернуть изменения с порядковым номером больше указанного. По умолчанию 0.
+      - limit (integer, опционально): максимальное количество изменений в ответе (по умолчанию 1000, не больше 10000).
+      - refbook (integer, опционально): только изменения указанного справочника.
+
+    При неверных значениях параметров возвращается HTTP 400.
+    """
+    default_limit = 1000
+    max_limit = 10000
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description="Порядковый номер последнего полученного изменения",
+                type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Максимальное количество изменений в ответе",
+                type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'refbook',
+                openapi.IN_QUERY,
+                description="Идентификатор справочника",
+                type=openapi.TYPE_INTEGER
+            )
+        ],
+        responses={
+            200: openapi.Response('Изменения справочников', schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'changes': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'seq': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'object_type': openapi.Schema(type=openapi.TYPE_STRING),
+                                'action': openapi.Schema(type=openapi.TYPE_STRING),
+                                'object_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'refbook_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'version_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'data': openapi.Schema(type=openapi.TYPE_OBJECT),
+                                'created_at': openapi.Schema(type=openapi.TYPE_STRING),
+                            }
+                        )
+                    ),
+                    'last_seq': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'has_more': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                }
+            )),
+            400: openapi.Response('Неверный параметр запроса')
+        }
+    )
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', self.default_limit))
+            refbook_id = request.query_params.get('refbook')
+            refbook_id = int(refbook_id) if refbook_id else None
+        except ValueError:
+            return Response(
+                {"error": "Параметры since, limit и refbook должны быть целыми числами"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if since < 0 or not 0 < limit <= self.max_limit:
+            return Response(
+                {"error": f"since должен быть неотрицательным, limit - от 1 до {self.max_limit}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Новые изменения элементов из журналов шардов получают порядковые номера основного журнала
+        collect_shard_changes()
+
+        queryset = RefBookChange.objects.filter(seq__gt=since).order_by('seq')
+        if refbook_id is not None:
+            queryset = queryset.filter(refbook_id=refbook_id)
+
+        changes = list(queryset[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        return Response({
+            "changes": RefBookChangeSerializer(changes, many=True).data,
+            "last_seq": changes[-1].seq if changes else since,
+            "has_more": has_more,
+        })
+
+
+class DocumentValidationAPIView(APIView):
+    """
+    Валидация документа по нескольким справочникам.
+
+    Описание:
+      Этот эндпоинт проверяет все кодированные поля документа за один вызов.
+      В теле запроса передается документ и соответствие путей к полям кодам справочников.
+      Путь состоит из ключей через точку, `*` означает каждый элемент списка, например `diagnoses.*`.
+      Значение поля - строка с кодом элемента (проверяется наличие кода) или объект
+      {"code": ..., "value": ...} (проверяется пара код - значение).
+
+    Параметры тела запроса:
+      - document (object, обязательный): проверяемый документ.
+      - fields (object, обязательный): пути к полям и коды справочников.
+      - date (string, формат: ГГГГ-ММ-ДД, опционально): дата, на которую выбираются версии справочников.
+      - normalized (boolean, опционально): сравнивать значения без учета регистра, ё/е и лишних пробелов.
+
+    Ответ содержит признак valid и список ошибок по полям. При неверном теле запроса возвращается HTTP 400.
+    """
+
+    @swagger_auto_schema(
+        request_body=DocumentValidationSerializer,
+        responses={
+            200: openapi.Response('Результат проверки документа', schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'valid': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    'checked': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'errors': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'field': openapi.Schema(type=openapi.TYPE_STRING),
+                                'refbook': openapi.Schema(type=openapi.TYPE_STRING),
+                                'code': openapi.Schema(type=openapi.TYPE_STRING),
+                                'error': openapi.Schema(type=openapi.TYPE_STRING),
+                                'version': openapi.Schema(type=openapi.TYPE_STRING),
+                                'expected': openapi.Schema(type=openapi.TYPE_STRING),
+                            }
+                        )
+                    ),
+                }
+            )),
+            400: openapi.Response('Неверное тело запроса')
+        }
+    )
+    def post(self, request):
+        serializer = DocumentValidationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(validate_document(**serializer.validated_data))
+
+
+class RefBookVersionImportAPIView(APIView):
+    """
+    Загрузка новой версии справочника.
+
+    Описание:
+      Этот эндпоинт принимает версию справочника с элементами и ставит ее загрузку в очередь фоновых задач.
+      Ответ возвращается сразу (HTTP 202) и содержит задачу, прогресс которой можно получить
+      через /jobs/<id>. Идентификатор справочника передается в URL.
+
+    Параметры тела запроса:
+      - version (string, обязательный): номер версии.
+      - date (string, формат: ГГГГ-ММ-ДД, обязательный): дата начала действия версии.
+      - elements (array, обязательный): элементы версии, объекты {"code": ..., "value": ...}.
+      - shared_storage (boolean, опционально): сохранить элементы в общем хранилище.
+
+    При неверном теле запроса, а также если у справочника уже есть версия с таким номером
+    или датой начала действия, возвращается HTTP 400.
+    Если справочник не найден — HTTP 404.
+    Доступен только администраторам (is_staff), для остальных возвращается HTTP 401 или 403.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        request_body=VersionImportSerializer,
+        responses={
+            202: openapi.Response('Задача загрузки поставлена в очередь', RefBookJobSerializer),
+            400: openapi.Response('Неверное тело запроса'),
+            403: openapi.Response('Доступ запрещен'),
+            404: openapi.Response('Справочник не найден')
+        }
+    )
+    def post(self, request, id):
+        refbook = get_object_or_404(RefBook, id=id)
+
+        serializer = VersionImportSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = serializer.validated_data
+        if refbook.versions.filter(Q(version=data['version']) | Q(date=data['date'])).exists():
+            return Response(
+                {"error": "У справочника уже есть версия с таким номером или датой начала действия"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        job = submit_job(
+            RefBookJob.KIND_IMPORT_VERSION,
+            {
+                'refbook_id': refbook.pk,
+                'version': data['version'],
+                'date': data['date'].isoformat(),
+                'shared_storage': data['shared_storage'],
+                'elements': data['elements'],
+            },
+            refbook=refbook
+        )
+        return Response(RefBookJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class RefBookJobAPIView(APIView):
+    """
+    Статус фоновой задачи.
+
+    Описание:
+      Этот эндпоинт возвращает статус фоновой задачи (pending, running, done, failed),
+      количество обработанных записей, прогресс в процентах, а также результат или текст ошибки.
+      Идентификатор задачи передается в URL.
+
+    Если задача не найдена — HTTP 404.
+    Доступен только администраторам (is_staff), для остальных возвращается HTTP 401 или 403.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        responses={
+            200: openapi.Response('Статус задачи', RefBookJobSerializer),
+            403: openapi.Response('Доступ запрещен'),
+            404: openapi.Response('Задача не найдена')
+        }
+    )
+    def get(self, request, id):
+        job = get_object_or_404(RefBookJob, id=id)
+        return Response(RefBookJobSerializer(job).data)